@@ -0,0 +1,808 @@
+"""Set-based bulk order engine.
+
+A bulk order file is handled as DataFrames instead of row by row:
+iter_order_chunks() streams an .xlsx, .csv or .parquet upload in bounded chunks, validate_order()
+checks every line of a chunk against an in-memory CatalogIndex of BULK_ORDER_TBL and
+process_order() takes stock, prices and taxes all accepted lines with one
+locked statement. The results match the original per-row rules:
+
+* item names are matched after casefolding and collapsing whitespace, and
+  the line is booked under the catalog spelling;
+* unknown items are rejected as "Invalid item", with the closest catalog
+  name by trigram similarity as a suggestion;
+* quantities outside 0..100 are rejected as "Invalid quantity", and
+  fractional ones as "Fractional quantity" (stock is counted in whole units);
+* a repeated item keeps its first position and its last quantity;
+* spl_flag = 'Y' items get no stock outside the special-menu window;
+* stock is taken partially, up to what is available, and a line that gets
+  nothing is rejected as a stock shortage;
+* price is unit price x quantity only when the unit price truncates to > 0,
+  and tax is price x the tax slab of a non-empty tax category (0 if missing).
+"""
+import hashlib
+import io
+import logging
+import os
+import socket
+import threading
+from collections import Counter
+from datetime import date, datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+import pytz
+from psycopg.types.json import Jsonb
+
+import sales_engine
+import stock_ledger
+
+REQUIRED_COLUMNS = ["Item name", "Quantity"]
+MAX_LINE_QTY = 100
+LOG_FLUSH_EVERY = int(os.environ.get('BULK_LOG_FLUSH_EVERY', 500))
+CHUNK_ROWS = int(os.environ.get('BULK_CHUNK_ROWS', 1000))
+MAX_UPLOAD_BYTES = int(os.environ.get('BULK_MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+JOB_CHUNK_LINES = int(os.environ.get('BULK_JOB_CHUNK_LINES', 200))
+JOB_POLL_INTERVAL = int(os.environ.get('BULK_JOB_POLL_INTERVAL', 5))
+JOB_STALE_SECS = int(os.environ.get('BULK_JOB_STALE_SECS', 300))
+SUGGEST_MIN_SCORE = float(os.environ.get('BULK_SUGGEST_MIN_SCORE', 0.4))
+
+
+SPL_WINDOW_HOURS = (17, 19)  # special-menu hours, Asia/Kolkata, inclusive
+
+
+def spl_window_open(now=None):
+    """True within the special-menu hours, when spl_flag = 'Y' items may be sold."""
+    now = now or datetime.now(pytz.timezone("Asia/Kolkata"))
+    return SPL_WINDOW_HOURS[0] <= now.hour <= SPL_WINDOW_HOURS[1]
+
+
+class BulkFileError(ValueError):
+    """An order file that cannot be read: too large, unreadable or missing columns."""
+
+
+class JobLostError(RuntimeError):
+    """The running job was reclaimed by another worker."""
+
+
+_CATALOG_SQL = "SELECT item_name, spl_flag FROM BULK_ORDER_TBL ORDER BY item_name"
+
+_TAKE_AND_PRICE_SQL = """
+    WITH req AS (
+        SELECT item_name, qty, ord
+        FROM unnest(%(items)s::text[], %(qtys)s::int[]) WITH ORDINALITY AS r(item_name, qty, ord)
+    ), bal AS (
+        SELECT r.ord, r.item_name, LEAST(r.qty, GREATEST(b.avail_stock, 0)) AS taken, b.avail_stock
+        FROM req r
+        JOIN stock_balance_vw b ON b.value_date = CURRENT_DATE AND b.item_name = r.item_name
+    ), mv AS (
+        INSERT INTO stock_movement_tbl (item_name, movement_type, quantity, reference)
+        SELECT item_name, 'BULK', -taken, %(ref)s FROM bal WHERE taken > 0
+        RETURNING item_name, movement_id
+    ), priced AS (
+        SELECT r.ord, r.item_name, COALESCE(bal.taken, 0) AS taken, mv.movement_id,
+               COALESCE(bal.avail_stock - bal.taken, 0) AS avail_stock,
+               CASE WHEN trunc(o.price) > 0 THEN o.price * COALESCE(bal.taken, 0) ELSE 0 END AS price,
+               CASE WHEN trunc(o.price) > 0 THEN NULLIF(o.tax_category, '') END AS tax_category
+        FROM req r
+        LEFT JOIN bal ON bal.ord = r.ord
+        LEFT JOIN mv ON mv.item_name = r.item_name
+        LEFT JOIN BULK_ORDER_TBL o ON o.item_name = r.item_name
+    )
+    SELECT p.item_name, p.taken, p.avail_stock, p.movement_id, p.price,
+           CASE WHEN p.tax_category IS NULL THEN 0 ELSE p.price * COALESCE(t.tax_slab, 0) END AS tax
+    FROM priced p
+    LEFT JOIN TAX_MAINTENANCE_TBL t ON t.category_name = p.tax_category
+    ORDER BY p.ord
+"""
+
+_LOG_INSERT_SQL = """
+    INSERT INTO bulk_order_log_tbl (value_date, file_name, log_message)
+    SELECT CURRENT_DATE, %(fil)s, msg FROM unnest(%(msgs)s::text[]) AS u(msg)
+    ON CONFLICT (value_date, file_name, log_message) DO NOTHING
+"""
+
+
+def insert_sales_rows(connection, rows, value_date=None):
+    """Insert [item, qty, price, ...] rows into sales_dtl_tbl and the daily rollup; the caller commits."""
+    value_date = (value_date or date.today()).strftime("%d-%b-%Y").upper()
+    ins_rec = [[value_date, str(row[0]), str(row[1]), str(row[2])] for row in rows]
+    if not ins_rec:
+        return 0
+    return sales_engine.record_sales(connection, ins_rec)
+
+
+class BulkLogBuffer:
+    """Collects bulk_order_log_tbl messages for one file and writes them in batches.
+
+    Messages are flushed as one multi-row INSERT every flush_every messages and
+    on flush()/exit; the table's unique key drops messages already logged for
+    the file today. Without a file name nothing is recorded.
+    """
+
+    def __init__(self, pool, file_name, flush_every=LOG_FLUSH_EVERY):
+        self._pool = pool
+        self.file_name = file_name
+        self.flush_every = flush_every
+        self._pending = {}  # insertion-ordered set of messages
+        self.written = 0
+
+    def add(self, message):
+        if not self.file_name:
+            return
+        self._pending[message] = None
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def extend(self, messages):
+        for message in messages:
+            self.add(message)
+
+    def flush(self, connection=None):
+        """Write pending messages; returns how many were new.
+
+        With a connection the write joins the caller's transaction and the
+        caller commits.
+        """
+        if not self._pending:
+            return 0
+        messages = list(self._pending)
+        if connection is None:
+            with self._pool.connection() as connection:
+                inserted = self._write(connection, messages)
+                connection.commit()
+        else:
+            inserted = self._write(connection, messages)
+        self._pending.clear()
+        self.written += inserted
+        return inserted
+
+    def _write(self, connection, messages):
+        cursor = connection.cursor()
+        cursor.execute(_LOG_INSERT_SQL, {"fil": self.file_name, "msgs": messages})
+        inserted = cursor.rowcount
+        cursor.close()
+        return inserted
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+        return False
+
+
+def _source_size(source):
+    size = getattr(source, "size", None)
+    if size is not None:
+        return size
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source)
+    pos = source.tell()
+    size = source.seek(0, os.SEEK_END)
+    source.seek(pos)
+    return size
+
+
+FILE_FORMATS = ("xlsx", "csv", "parquet")
+_MISSING_COLUMNS = "The order file must contain 'Item name' and 'Quantity' columns."
+
+
+def detect_format(source):
+    """Sniff an order file's format from its magic bytes: xlsx (zip), parquet or csv."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fp:
+            head = fp.read(4)
+    else:
+        pos = source.tell()
+        head = source.read(4)
+        source.seek(pos)
+    if head.startswith(b"PK"):
+        return "xlsx"
+    if head == b"PAR1":
+        return "parquet"
+    return "csv"
+
+
+def iter_order_chunks(source, chunk_rows=CHUNK_ROWS, max_bytes=MAX_UPLOAD_BYTES, file_format=None):
+    """Stream (Item name, Quantity) rows of an order file in DataFrame chunks.
+
+    source is a path or a binary buffer (e.g. a Streamlit UploadedFile) holding
+    an .xlsx, .csv or .parquet file; the format is sniffed unless given. Every
+    reader streams, so memory stays bounded by chunk_rows whatever the file
+    size. Yields (chunk, rows_read, total_rows); total_rows may be None. Blank
+    rows are skipped. Raises BulkFileError for files over max_bytes, unreadable
+    files or files without the required columns.
+    """
+    size = _source_size(source)
+    if size > max_bytes:
+        raise BulkFileError(f"Order file is {size / 1048576:.1f} MB; the limit is {max_bytes / 1048576:.1f} MB.")
+    if hasattr(source, "seek"):
+        source.seek(0)
+    readers = {"xlsx": _iter_xlsx_chunks, "csv": _iter_csv_chunks, "parquet": _iter_parquet_chunks}
+    return readers[file_format or detect_format(source)](source, chunk_rows)
+
+
+def _iter_csv_chunks(source, chunk_rows):
+    try:
+        reader = pd.read_csv(source, usecols=lambda col: col in REQUIRED_COLUMNS, chunksize=chunk_rows)
+        rows_read = 0
+        for chunk in reader:
+            if not all(col in chunk.columns for col in REQUIRED_COLUMNS):
+                raise BulkFileError(_MISSING_COLUMNS)
+            chunk = chunk[REQUIRED_COLUMNS].dropna(how="all")
+            rows_read += len(chunk)
+            yield chunk.reset_index(drop=True), rows_read, None
+    except BulkFileError:
+        raise
+    except (ValueError, pd.errors.ParserError) as e:
+        raise BulkFileError(f"Error reading the CSV file: {e}") from e
+
+
+def _iter_parquet_chunks(source, chunk_rows):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise BulkFileError("Parquet order files need the pyarrow package.") from e
+    try:
+        parquet = pq.ParquetFile(source)
+    except Exception as e:
+        raise BulkFileError(f"Error reading the Parquet file: {e}") from e
+    if not all(col in parquet.schema_arrow.names for col in REQUIRED_COLUMNS):
+        raise BulkFileError(_MISSING_COLUMNS)
+    total_rows = parquet.metadata.num_rows
+    rows_read = 0
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=REQUIRED_COLUMNS):
+        chunk = batch.to_pandas().dropna(how="all")
+        rows_read += batch.num_rows
+        yield chunk.reset_index(drop=True), rows_read, total_rows
+
+
+def _iter_xlsx_chunks(source, chunk_rows):
+    try:
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    except Exception as e:
+        raise BulkFileError(f"Error reading the Excel file: {e}") from e
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(h) if h is not None else "" for h in next(rows, ())]
+        if not all(col in header for col in REQUIRED_COLUMNS):
+            raise BulkFileError(_MISSING_COLUMNS)
+        positions = [header.index(col) for col in REQUIRED_COLUMNS]
+        total_rows = sheet.max_row - 1 if sheet.max_row else None
+        buf = []
+        rows_read = 0
+        for row in rows:
+            values = [row[i] if i < len(row) else None for i in positions]
+            if all(v is None for v in values):
+                continue
+            buf.append(values)
+            rows_read += 1
+            if len(buf) >= chunk_rows:
+                yield pd.DataFrame(buf, columns=REQUIRED_COLUMNS), rows_read, total_rows
+                buf = []
+        if buf:
+            yield pd.DataFrame(buf, columns=REQUIRED_COLUMNS), rows_read, total_rows
+    finally:
+        workbook.close()
+
+
+def normalize_name(name):
+    """Casefold an item name and collapse its whitespace."""
+    return " ".join(str(name).split()).casefold()
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+class CatalogIndex:
+    """In-memory normalized and trigram index over the BULK_ORDER_TBL item names.
+
+    resolve() matches a whole column of names at once: exact names first, then
+    names equal after normalize_name(), and for the rest the catalog name with
+    the highest cosine similarity of character trigram counts, computed as one
+    matrix product against the catalog.
+    """
+
+    def __init__(self, catalog):
+        self.spl_flags = dict(catalog)
+        self.names = list(self.spl_flags)
+        self._by_norm = {}
+        for name in self.names:
+            self._by_norm.setdefault(normalize_name(name), name)
+        self._vocab = {}
+        for name in self.names:
+            for gram in _trigrams(normalize_name(name)):
+                self._vocab.setdefault(gram, len(self._vocab))
+        self._matrix = self._vectors([normalize_name(name) for name in self.names])
+
+    def __len__(self):
+        return len(self.names)
+
+    def _vectors(self, texts):
+        """L2-normalised trigram count rows; trigrams unknown to the catalog still count in the norm."""
+        matrix = np.zeros((len(texts), len(self._vocab)), dtype=np.float32)
+        norms = np.ones(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            grams = Counter(_trigrams(text))
+            norms[row] = np.sqrt(sum(n * n for n in grams.values())) or 1.0
+            for gram, n in grams.items():
+                col = self._vocab.get(gram)
+                if col is not None:
+                    matrix[row, col] = n
+        return matrix / norms[:, None]
+
+    def resolve(self, names):
+        """Match a Series of names; returns a frame on the same index.
+
+        Columns: Item (catalog name or None), Match ("exact", "normalized" or
+        None), Suggestion and Score (closest catalog name and its similarity
+        for unmatched names, when the score reaches SUGGEST_MIN_SCORE).
+        """
+        present = names.notna()
+        norm = names.where(present, "").map(normalize_name)
+        exact = names.isin(self.spl_flags.keys())
+        item = names.where(exact, norm.map(self._by_norm))
+        item = item.where(present & item.notna(), None)
+        match = pd.Series(np.where(exact, "exact", np.where(item.notna(), "normalized", None)), index=names.index)
+        result = pd.DataFrame({"Item": item, "Match": match, "Suggestion": None, "Score": np.nan}, index=names.index)
+
+        misses = pd.unique(norm[item.isna() & (norm != "")])
+        if len(misses) and len(self.names):
+            scores = self._vectors(list(misses)) @ self._matrix.T
+            best = scores.argmax(axis=1)
+            best_score = scores[np.arange(len(misses)), best]
+            keep = best_score >= SUGGEST_MIN_SCORE
+            suggestion = dict(zip(misses[keep], np.asarray(self.names, dtype=object)[best[keep]]))
+            score = dict(zip(misses[keep], best_score[keep].round(2)))
+            unmatched = item.isna()
+            result.loc[unmatched, "Suggestion"] = norm[unmatched].map(suggestion)
+            result.loc[unmatched, "Score"] = norm[unmatched].map(score)
+        return result
+
+
+def load_catalog_index(pool):
+    """Build a CatalogIndex from BULK_ORDER_TBL with one query."""
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(_CATALOG_SQL)
+        catalog = cursor.fetchall()
+        cursor.close()
+    return CatalogIndex(catalog)
+
+
+REJECTED_COLUMNS = ["Item Name", "Quantity", "Reason", "Message", "Suggestion", "Score"]
+
+
+def _message_frame(rows):
+    return pd.DataFrame(rows, columns=REJECTED_COLUMNS)
+
+
+def validate_order(pool, frame, index=None):
+    """Validate an uploaded order frame against the catalog index.
+
+    Names are resolved with index (loaded from BULK_ORDER_TBL when not given)
+    and valid lines carry the catalog spelling. Returns (orders, rejected,
+    log): orders has one row per distinct valid item with columns Item Name,
+    Quantity and spl_flag; rejected lists the invalid lines, with a suggested
+    catalog name and score for unknown items; log is the per-line message
+    list in file order.
+    """
+    if index is None:
+        index = load_catalog_index(pool)
+    frame = frame[REQUIRED_COLUMNS].reset_index(drop=True)
+    resolved = index.resolve(frame["Item name"])
+    names = resolved["Item"]
+
+    qty = pd.to_numeric(frame["Quantity"], errors="coerce")
+    known = names.notna()
+    # Stock is counted in whole units: a fractional quantity is rejected
+    # instead of being truncated before stock is taken and priced.
+    in_range = qty.between(0, MAX_LINE_QTY)
+    whole = qty.mod(1).eq(0)
+    qty_ok = in_range & whole
+
+    label = names.where(known, frame["Item name"]).map(str)
+    log = ("Feteching Item - " + label + "\n").where(known & qty_ok, "Invalid quantity - " + label + "\n")
+    log = log.where(known, "Invalid item- " + label + "\n")
+
+    reason = known.map({True: "Invalid quantity", False: "Invalid item"}).mask(known & in_range & ~whole, "Fractional quantity")
+    bad = frame[~(known & qty_ok)]
+    rejected = _message_frame({
+        "Item Name": bad["Item name"],
+        "Quantity": bad["Quantity"],
+        "Reason": reason[bad.index],
+        "Message": log[bad.index],
+        "Suggestion": resolved["Suggestion"][bad.index],
+        "Score": resolved["Score"][bad.index],
+    })
+
+    good = pd.DataFrame({"Item Name": names[known & qty_ok], "Quantity": qty[known & qty_ok].astype(int)})
+    first_pos = good.groupby("Item Name", sort=False).head(1)["Item Name"]
+    last_qty = good.groupby("Item Name", sort=False)["Quantity"].last()
+    orders = pd.DataFrame({"Item Name": first_pos.values, "Quantity": last_qty[first_pos].values})
+    orders["spl_flag"] = orders["Item Name"].map(index.spl_flags)
+    return orders, rejected.reset_index(drop=True), log.tolist()
+
+
+def validate_stream(pool, chunks, on_chunk=None, index=None):
+    """Validate the chunks of iter_order_chunks() one at a time.
+
+    Orders are merged across chunks with the same first-position/last-quantity
+    rule as validate_order(), so only the distinct valid items and the rejected
+    lines are kept in memory. The catalog index is loaded once per stream
+    unless given. on_chunk(log, rows_read, total_rows) is called after each
+    chunk with that chunk's messages. Returns (orders, rejected, line_count,
+    total_qty).
+    """
+    if index is None:
+        index = load_catalog_index(pool)
+    merged = {}
+    rejected = []
+    line_count = 0
+    total_qty = 0
+    for chunk, rows_read, total_rows in chunks:
+        orders, chunk_rejected, log = validate_order(pool, chunk, index)
+        merged.update({item: (qty, spl) for item, qty, spl in orders.itertuples(index=False)})
+        if not chunk_rejected.empty:
+            rejected.append(chunk_rejected)
+        line_count += len(chunk)
+        total_qty += pd.to_numeric(chunk["Quantity"], errors="coerce").sum()
+        if on_chunk:
+            on_chunk(log, rows_read, total_rows)
+    orders = pd.DataFrame([(item, qty, spl) for item, (qty, spl) in merged.items()],
+                          columns=["Item Name", "Quantity", "spl_flag"])
+    rejected = pd.concat(rejected, ignore_index=True) if rejected else _message_frame([])
+    return orders, rejected, line_count, total_qty
+
+
+def process_order(pool, orders, spl_window_open, reference=None):
+    """Take stock for, price and tax every order line in one transaction.
+
+    Returns (accepted, rejected, levels): accepted has Item Name, Quantity,
+    Price, Tax and Message; rejected lists the stock shortages; levels maps
+    each accepted item to (remaining stock, id of its BULK movement).
+    """
+    with pool.connection() as connection:
+        result = process_order_in(connection, orders, spl_window_open, reference)
+        connection.commit()
+    return result
+
+
+def process_order_in(connection, orders, spl_window_open, reference=None):
+    """process_order() inside the caller's transaction; the caller commits."""
+    if orders.empty:
+        return (pd.DataFrame(columns=["Item Name", "Quantity", "Price", "Tax", "Message"]),
+                _message_frame([]), {})
+    qty = orders["Quantity"].astype(int)
+    if not spl_window_open:
+        qty = qty.where(orders["spl_flag"] != 'Y', 0)
+    items = orders["Item Name"].tolist()
+    cursor = connection.cursor()
+    stock_ledger.lock_items(cursor, items)
+    cursor.execute(_TAKE_AND_PRICE_SQL, {"items": items, "qtys": qty.tolist(), "ref": reference})
+    result = pd.DataFrame(cursor.fetchall(), columns=["Item Name", "Quantity", "Stock", "Movement", "Price", "Tax"])
+    cursor.close()
+
+    taken = result["Quantity"] != 0
+    accepted = result[taken].reset_index(drop=True)
+    accepted["Message"] = ("processing " + accepted["Item Name"] + " and quantity : "
+                           + accepted["Quantity"].astype(str) + "\n")
+    short = result[~taken]
+    rejected = _message_frame({
+        "Item Name": short["Item Name"],
+        "Quantity": short["Quantity"],
+        "Reason": "Stock shortage",
+        "Message": short["Item Name"] + " 0 - Rejected due to stock shortage\n",
+    }).reset_index(drop=True)
+    levels = {item: (int(stock), int(movement_id)) for item, stock, movement_id
+              in zip(accepted["Item Name"], accepted["Stock"], accepted["Movement"])}
+    return accepted.drop(columns=["Stock", "Movement"]), rejected, levels
+
+
+# --- Upload fingerprints ---
+# A bulk_order_header_tbl row is identified by (value_date, content_hash): the
+# same bytes uploaded again under another name are a duplicate, while a
+# different file that reuses a name is a new upload.
+
+_REGISTER_SQL = """
+    WITH ins AS (
+        INSERT INTO bulk_order_header_tbl (value_date, file_name, status, content_hash)
+        VALUES (CURRENT_DATE, %(fil)s, 'OPEN', %(hash)s)
+        ON CONFLICT (value_date, content_hash) WHERE content_hash IS NOT NULL DO NOTHING
+        RETURNING file_name, status, true AS is_new
+    )
+    SELECT file_name, status, is_new FROM ins
+    UNION ALL
+    SELECT file_name, status, false FROM bulk_order_header_tbl
+    WHERE value_date = CURRENT_DATE AND content_hash = %(hash)s
+"""
+
+_REGISTERED_SQL = """
+    SELECT file_name, status, false FROM bulk_order_header_tbl
+    WHERE value_date = CURRENT_DATE AND content_hash = %(hash)s
+"""
+
+
+def content_hash(source, block_size=1 << 20):
+    """SHA-256 hex digest of a path, bytes or binary buffer, read in blocks."""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+        return digest.hexdigest()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as fp:
+            for block in iter(lambda: fp.read(block_size), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    pos = source.tell()
+    source.seek(0)
+    for block in iter(lambda: source.read(block_size), b""):
+        digest.update(block)
+    source.seek(pos)
+    return digest.hexdigest()
+
+
+def register_upload(pool, file_name, digest):
+    """Record today's upload by content hash in one statement.
+
+    Returns (file_name, status, is_new): for content already uploaded today the
+    existing row's name and status, otherwise the new OPEN row. Both halves of
+    the statement read one snapshot, so when a concurrent upload of the same
+    bytes commits while the insert waits on it, neither returns a row; that
+    row is then read by a second statement, which sees the commit.
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(_REGISTER_SQL, {"fil": file_name, "hash": digest})
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute(_REGISTERED_SQL, {"hash": digest})
+            row = cursor.fetchone()
+        cursor.close()
+        connection.commit()
+    return row[0], row[1], bool(row[2])
+
+
+# --- Background bulk-import jobs ---
+# A job is a bulk_order_header_tbl row with file_data set. Status moves
+# OPEN -> RUNNING -> Processed/Failed; progress_rows counts the order lines
+# already committed, so a job picked up again after a crash resumes there.
+
+_CLAIM_SQL = """
+    UPDATE bulk_order_header_tbl h
+    SET status = 'RUNNING', worker = %(worker)s, started_at = COALESCE(h.started_at, now()), heartbeat_at = now()
+    FROM (SELECT value_date, content_hash FROM bulk_order_header_tbl
+          WHERE file_data IS NOT NULL AND content_hash IS NOT NULL
+            AND (status = 'OPEN' OR (status = 'RUNNING' AND heartbeat_at < now() - make_interval(secs => %(stale)s)))
+          ORDER BY queued_at
+          LIMIT 1
+          FOR UPDATE SKIP LOCKED) j
+    WHERE h.value_date = j.value_date AND h.content_hash = j.content_hash
+    RETURNING h.value_date, h.content_hash, h.file_name, h.file_data, h.progress_rows
+"""
+
+_CHUNK_DONE_SQL = """
+    UPDATE bulk_order_header_tbl
+    SET progress_rows = %(done)s, sub_total = sub_total + %(sub)s, tax_total = tax_total + %(tax)s,
+        result_lines = result_lines || %(lines)s, heartbeat_at = now()
+    WHERE value_date = %(vdate)s AND content_hash = %(hash)s AND worker = %(worker)s AND status = 'RUNNING'
+"""
+
+_HEARTBEAT_SQL = """
+    UPDATE bulk_order_header_tbl SET heartbeat_at = now(), total_rows = COALESCE(%(n)s, total_rows)
+    WHERE value_date = %(vdate)s AND content_hash = %(hash)s AND worker = %(worker)s AND status = 'RUNNING'
+"""
+
+JOB_COLUMNS = ["value_date", "file_name", "content_hash", "status", "total_rows", "progress_rows", "sub_total",
+               "tax_total", "result_lines", "message", "worker", "queued_at", "started_at", "finished_at"]
+
+
+def enqueue_job(pool, digest, file_data):
+    """Queue today's upload with this content hash for the workers.
+
+    Returns False if it is already queued, running or processed.
+    """
+    upd_qry = """
+        UPDATE bulk_order_header_tbl
+        SET file_data = %(data)s, status = 'OPEN', queued_at = now(), message = NULL, finished_at = NULL
+        WHERE value_date = CURRENT_DATE AND content_hash = %(hash)s
+          AND (status = 'Failed' OR (status = 'OPEN' AND file_data IS NULL))
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(upd_qry, {"hash": digest, "data": file_data})
+        queued = cursor.rowcount > 0
+        cursor.close()
+        connection.commit()
+    return queued
+
+
+def start_job(pool, digest, file_data, worker):
+    """Claim today's upload with this content hash directly as RUNNING (no queue wait).
+
+    Returns (value_date, progress_rows), or None when another worker owns it
+    or it is already processed.
+    """
+    upd_qry = """
+        UPDATE bulk_order_header_tbl
+        SET file_data = %(data)s, status = 'RUNNING', worker = %(worker)s, queued_at = now(),
+            started_at = COALESCE(started_at, now()), heartbeat_at = now(), message = NULL, finished_at = NULL
+        WHERE value_date = CURRENT_DATE AND content_hash = %(hash)s AND status IN ('OPEN', 'Failed')
+        RETURNING value_date, progress_rows
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(upd_qry, {"hash": digest, "data": file_data, "worker": worker})
+        row = cursor.fetchone()
+        cursor.close()
+        connection.commit()
+    return row
+
+
+def get_job(pool, digest, value_date=None):
+    """The job row for a content hash (today unless value_date is given) as a dict, or None."""
+    sel_qry = (f"SELECT {', '.join(JOB_COLUMNS)} FROM bulk_order_header_tbl "
+               "WHERE value_date = COALESCE(%(vdate)s, CURRENT_DATE) AND content_hash = %(hash)s")
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(sel_qry, {"hash": digest, "vdate": value_date})
+        row = cursor.fetchone()
+        cursor.close()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+def list_jobs(pool):
+    """Today's queued and finished jobs, newest first."""
+    sel_qry = """
+        SELECT file_name, status, progress_rows, total_rows, sub_total + tax_total, worker, queued_at, finished_at, message
+        FROM bulk_order_header_tbl
+        WHERE value_date = CURRENT_DATE AND queued_at IS NOT NULL
+        ORDER BY queued_at DESC
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(sel_qry)
+        rows = cursor.fetchall()
+        cursor.close()
+    return pd.DataFrame(rows, columns=["File", "Status", "Done", "Lines", "Bill Amt", "Worker", "Queued", "Finished", "Message"])
+
+
+def set_job_status(pool, value_date, digest, status, message=None, worker=None):
+    """Finish a job; with worker, only while that worker still owns it. Returns whether the row was updated."""
+    upd_qry = """
+        UPDATE bulk_order_header_tbl SET status = %(st)s, message = %(msg)s, finished_at = now(), file_data = NULL
+        WHERE value_date = %(vdate)s AND content_hash = %(hash)s
+          AND (%(worker)s::text IS NULL OR (worker = %(worker)s AND status = 'RUNNING'))
+    """
+    with pool.connection() as connection:
+        cursor = connection.execute(upd_qry, {"st": status, "msg": message, "vdate": value_date,
+                                              "hash": digest, "worker": worker})
+        updated = cursor.rowcount > 0
+        connection.commit()
+    return updated
+
+
+def heartbeat_job(connection, value_date, digest, worker, total_rows=None):
+    """Mark the job alive (and set total_rows if given); raises JobLostError once another worker owns it."""
+    cursor = connection.execute(_HEARTBEAT_SQL, {"n": total_rows, "vdate": value_date, "hash": digest, "worker": worker})
+    if cursor.rowcount == 0:
+        connection.rollback()
+        raise JobLostError(f"job {digest[:12]} was reclaimed by another worker")
+    connection.commit()
+
+
+def run_job(pool, value_date, digest, file_name, file_data, worker, done=0, spl_window_open=False,
+            chunk_lines=JOB_CHUNK_LINES, on_levels=None):
+    """Validate and process one queued file, committing every chunk_lines order lines.
+
+    Each chunk's stock movements, sales rows, log messages and progress are
+    committed together. Lines before done were committed by an earlier run
+    and are skipped. The heartbeat is refreshed after every validated file
+    chunk and every committed order chunk, and each of those writes only
+    succeeds while worker still owns the job; otherwise the open chunk is
+    rolled back and JobLostError is raised. Ends with status Processed and
+    returns a summary dict of this run's line counts and the job's bill totals.
+    """
+    log_sink = BulkLogBuffer(pool, file_name)
+
+    def on_chunk(log, *_):
+        log_sink.extend(log)
+        with pool.connection() as connection:
+            heartbeat_job(connection, value_date, digest, worker)
+
+    orders, rejected, line_cnt, tot_qty = validate_stream(pool, iter_order_chunks(io.BytesIO(file_data)), on_chunk=on_chunk)
+    log_sink.flush()
+    with pool.connection() as connection:
+        heartbeat_job(connection, value_date, digest, worker, total_rows=len(orders))
+
+    accepted_cnt = 0
+    short_cnt = 0
+    for start in range(done, len(orders), chunk_lines):
+        chunk = orders.iloc[start:start + chunk_lines]
+        with pool.connection() as connection:
+            accepted, short, levels = process_order_in(connection, chunk, spl_window_open, file_name)
+            accepted_cnt += len(accepted)
+            short_cnt += len(short)
+            lines = accepted[["Item Name", "Quantity", "Price", "Tax"]].values.tolist()
+            insert_sales_rows(connection, lines, value_date)
+            log_sink.extend(short["Message"].tolist() + accepted["Message"].tolist())
+            log_sink.flush(connection)
+            cursor = connection.execute(_CHUNK_DONE_SQL, {
+                "done": start + len(chunk), "sub": accepted["Price"].sum(), "tax": accepted["Tax"].sum(),
+                "lines": Jsonb([[item, int(qty), str(price), str(tax)] for item, qty, price, tax in lines]),
+                "vdate": value_date, "hash": digest, "worker": worker})
+            if cursor.rowcount == 0:
+                connection.rollback()
+                raise JobLostError(f"{file_name} was reclaimed by another worker at line {start}")
+            connection.commit()
+        if on_levels:
+            on_levels(levels)
+
+    job = get_job(pool, digest, value_date)
+    log_sink.add(f"Tot. Bill Amt For current order =  Rs.{float(job['sub_total'] + job['tax_total']):.2f}")
+    log_sink.flush()
+    if not set_job_status(pool, value_date, digest, "Processed", worker=worker):
+        raise JobLostError(f"{file_name} was reclaimed by another worker before it finished")
+    return {"lines": line_cnt, "quantity": tot_qty, "orders": len(orders), "accepted": accepted_cnt,
+            "invalid": len(rejected), "short": short_cnt, "sub_total": job["sub_total"], "tax_total": job["tax_total"]}
+
+
+class BulkJobWorkers:
+    """Worker threads that claim and run queued bulk jobs.
+
+    Jobs are claimed with FOR UPDATE SKIP LOCKED, so workers in every replica
+    can share the queue; wake() lets a worker in this process start at once.
+    """
+
+    def __init__(self, pool, count, spl_window_open, on_levels=None):
+        self._pool = pool
+        self._spl_window_open = spl_window_open
+        self._on_levels = on_levels
+        self._wake = threading.Event()
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.threads = [threading.Thread(target=self._loop, name=f"bulk-worker-{i}", daemon=True) for i in range(count)]
+        for thread in self.threads:
+            thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _claim(self, worker):
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(_CLAIM_SQL, {"worker": worker, "stale": JOB_STALE_SECS})
+            row = cursor.fetchone()
+            cursor.close()
+            connection.commit()
+        return row
+
+    def _loop(self):
+        worker = f"{self.name}/{threading.current_thread().name}"
+        while True:
+            try:
+                job = self._claim(worker)
+            except Exception as e:
+                logging.error(f"Bulk job claim error: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(JOB_POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            value_date, digest, file_name, file_data, done = job
+            logging.info(f"Bulk job {file_name} started at line {done}")
+            try:
+                run_job(self._pool, value_date, digest, file_name, bytes(file_data), worker, done,
+                        self._spl_window_open(), on_levels=self._on_levels)
+                logging.info(f"Bulk job {file_name} processed")
+            except JobLostError as e:
+                logging.warning(f"Bulk job {file_name} abandoned: {e}")
+            except Exception as e:
+                logging.error(f"Bulk job {file_name} failed: {e}")
+                try:
+                    set_job_status(self._pool, value_date, digest, "Failed", str(e), worker=worker)
+                except Exception as e2:
+                    logging.error(f"Bulk job {file_name} status update error: {e2}")
@@ -0,0 +1,115 @@
+"""Headless bulk order importer.
+
+Processes every order file (.xlsx, .csv, .parquet) matched by a directory
+or glob through the same bulk_engine path as the Bulk Orders tab: content-hash
+duplicate check, bulk_order_header_tbl job status, chunked stock/sales commits
+and bulk_order_log_tbl messages. No Streamlit runtime is needed.
+
+    python bulk_import_cli.py /data/orders --workers 4 --summary summary.csv
+    python bulk_import_cli.py "/data/orders/*_26oct.xlsx"
+
+Database settings come from the same environment variables as the app
+(DB_HOST, DB_PORT, DB_NAME, DBP_USER, DBP_PASSWORD).
+"""
+import argparse
+import glob
+import logging
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from dotenv import load_dotenv
+import bulk_engine
+import db
+import migrations
+import stock_ledger
+
+SUMMARY_COLUMNS = ["File", "Status", "Lines", "Accepted", "Invalid", "Short", "Subtotal", "Tax", "Bill Amt", "Seconds", "Message"]
+
+
+def find_files(target):
+    """Order files in a directory or matched by a glob, sorted by name."""
+    pattern = os.path.join(target, "*") if os.path.isdir(target) else target
+    suffixes = tuple("." + fmt for fmt in bulk_engine.FILE_FORMATS)
+    return sorted(path for path in glob.glob(pattern) if path.lower().endswith(suffixes) and os.path.isfile(path))
+
+
+def import_file(pool, path, worker):
+    """Run one file through the bulk path; returns its summary row."""
+    file_name = os.path.splitext(os.path.basename(path))[0]
+    start = time.perf_counter()
+    row = dict.fromkeys(SUMMARY_COLUMNS, 0)
+    row.update({"File": os.path.basename(path), "Message": ""})
+    try:
+        with open(path, "rb") as fp:
+            file_data = fp.read()
+        digest = bulk_engine.content_hash(file_data)
+        known_name, status, is_new = bulk_engine.register_upload(pool, file_name, digest)
+        if status == "Processed":
+            row.update({"Status": "Duplicate", "Message": f"same content as '{known_name}', already processed today"})
+            return row
+        job = bulk_engine.start_job(pool, digest, file_data, worker)
+        if job is None:
+            row.update({"Status": "Skipped", "Message": f"'{known_name}' is being processed by another worker"})
+            return row
+        value_date, done = job
+        try:
+            summary = bulk_engine.run_job(pool, value_date, digest, known_name, file_data, worker, done,
+                                          bulk_engine.spl_window_open())
+        except bulk_engine.JobLostError:
+            raise
+        except Exception as e:
+            bulk_engine.set_job_status(pool, value_date, digest, "Failed", str(e), worker=worker)
+            raise
+        row.update({"Status": "Processed", "Lines": summary["lines"], "Accepted": summary["accepted"],
+                    "Invalid": summary["invalid"], "Short": summary["short"],
+                    "Subtotal": float(summary["sub_total"]), "Tax": float(summary["tax_total"]),
+                    "Bill Amt": float(summary["sub_total"] + summary["tax_total"])})
+        if known_name != file_name:
+            row["Message"] = f"same content as '{known_name}'"
+    except Exception as e:
+        logging.error(f"{path}: {e}")
+        row.update({"Status": "Failed", "Message": str(e)})
+    finally:
+        row["Seconds"] = round(time.perf_counter() - start, 2)
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import bulk order files without the Streamlit app.")
+    parser.add_argument("target", help="directory of order files or a glob pattern")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get('BULK_WORKERS', 2)),
+                        help="files processed concurrently (default: BULK_WORKERS or 2)")
+    parser.add_argument("--summary", help="also write the per-file summary to this CSV file")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(threadName)s %(message)s")
+    files = find_files(args.target)
+    if not files:
+        print(f"No order files found for {args.target}", file=sys.stderr)
+        return 1
+
+    workers = max(1, args.workers)
+    pool = db.open_pool(workers + 1, "bulk-import-cli")
+    try:
+        migrations.apply(pool, db.MIGRATIONS_DIR)
+        stock_ledger.rollover_daily_stock(pool)
+        worker = f"{socket.gethostname()}:{os.getpid()}/cli"
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-cli") as executor:
+            rows = list(executor.map(lambda path: import_file(pool, path, worker), files))
+    finally:
+        pool.close()
+
+    report = pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+    print(report.to_string(index=False))
+    if args.summary:
+        report.to_csv(args.summary, index=False)
+    return 0 if (report["Status"] != "Failed").all() else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
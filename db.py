@@ -0,0 +1,46 @@
+"""PostgreSQL settings shared by the app and the command-line tools.
+
+Connection settings come from the environment (DB_HOST, DB_PORT, DB_NAME,
+DBP_USER, DBP_PASSWORD) and are read when a pool is opened, so callers can
+load a .env file first. FILES_DIR holds the read-only SQL/DDL files and
+MIGRATIONS_DIR the versioned schema history applied by migrations.apply().
+"""
+import os
+
+from psycopg_pool import ConnectionPool
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FILES_DIR = os.environ.get('FILES_DIR', os.path.join(BASE_DIR, 'Files'))
+MIGRATIONS_DIR = os.path.join(FILES_DIR, 'migrations')
+
+_REQUIRED = (("DB_HOST", "host"), ("DB_NAME", "dbname"), ("DBP_USER", "user"), ("DBP_PASSWORD", "password"))
+
+
+def connection_kwargs(prepare_threshold=None):
+    """psycopg connect() arguments from the environment."""
+    return {
+        "host": os.environ.get('DB_HOST'),
+        "port": os.environ.get('DB_PORT', '6543'),
+        "dbname": os.environ.get('DB_NAME'),
+        "user": os.environ.get('DBP_USER'),
+        "password": os.environ.get('DBP_PASSWORD'),
+        "sslmode": 'require',  # For Supabase/SSL-enabled PG
+        "prepare_threshold": prepare_threshold,
+    }
+
+
+def missing_settings(kwargs):
+    """Names of the required environment variables that connection_kwargs() found unset."""
+    return [env for env, key in _REQUIRED if not kwargs[key]]
+
+
+def open_pool(max_size, name, min_size=1):
+    """Open a pool for a command-line tool; exits with a message when settings are missing."""
+    kwargs = connection_kwargs()
+    missing = missing_settings(kwargs)
+    if missing:
+        raise SystemExit(f"Missing DB environment variables: {', '.join(missing)}")
+    pool = ConnectionPool(kwargs=kwargs, min_size=min_size, max_size=max_size, check=ConnectionPool.check_connection,
+                          name=name, open=False)
+    pool.open(wait=True, timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)))
+    return pool
@@ -154,6 +154,14 @@ resource "aws_lb_target_group" "streamlit" {
   vpc_id      = aws_vpc.main.id
   target_type = "ip"
 
+  # Streamlit keeps each session's state in the task that served its
+  # websocket, so a browser must keep reaching the same task.
+  stickiness {
+    type            = "lb_cookie"
+    cookie_duration = 86400
+    enabled         = true
+  }
+
   health_check {
     path                = "/"
     interval            = 30
@@ -263,7 +271,7 @@ resource "aws_ecs_service" "main" {
   name            = "restaurant-service"
   cluster         = aws_ecs_cluster.main.id
   task_definition = aws_ecs_task_definition.streamlit.arn
-  desired_count   = 1
+  desired_count   = var.service_desired_count
   launch_type     = "FARGATE"
 
   network_configuration {
@@ -314,6 +322,12 @@ variable "db_password" {
   sensitive   = true
 }
 
+variable "service_desired_count" {
+  description = "Number of app tasks behind the ALB (uploads and reports are stateless)"
+  type        = number
+  default     = 2
+}
+
 #############################
 # outputs.tf
 #############################
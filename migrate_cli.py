@@ -0,0 +1,50 @@
+"""Apply or check the versioned schema migrations in Files/migrations.
+
+    python migrate_cli.py apply     # apply pending versions in order
+    python migrate_cli.py verify    # exit 1 if the database and the files disagree
+    python migrate_cli.py status    # list every version and when it was applied
+
+Database settings come from the same environment variables as the app
+(DB_HOST, DB_PORT, DB_NAME, DBP_USER, DBP_PASSWORD).
+"""
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+import db
+import migrations
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the versioned schema migrations.")
+    parser.add_argument("command", choices=["apply", "verify", "status"])
+    parser.add_argument("--dir", default=db.MIGRATIONS_DIR, help="migration files directory (default: Files/migrations)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    pool = db.open_pool(1, "migrate-cli")
+    try:
+        if args.command == "apply":
+            applied = migrations.apply(pool, args.dir)
+            print("\n".join(f"Applied {name}" for name in applied) or "Schema is up to date.")
+            problems = migrations.verify(pool, args.dir)
+        elif args.command == "verify":
+            problems = migrations.verify(pool, args.dir)
+        else:
+            for version, name, applied_at, matches in migrations.status(pool, args.dir):
+                state = applied_at.strftime("%Y-%m-%d %H:%M:%S") if applied_at else "pending"
+                print(f"{version:03d}_{name:<24} {state}{'' if matches else '  (file changed)'}")
+            problems = []
+    except migrations.MigrationError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        pool.close()
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
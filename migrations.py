@@ -0,0 +1,140 @@
+"""Versioned schema migrations.
+
+Files/migrations/NNN_name.txt hold the schema history in version order.
+apply() runs each pending file in its own transaction and records it in
+schema_migrations with a SHA-256 checksum; verify() reports pending
+versions, edited or unknown history and indexes that a migration declares
+but the database lacks. Migrations are written to be safe on databases
+created before this history existed (IF NOT EXISTS throughout).
+"""
+import hashlib
+import os
+import re
+from collections import namedtuple
+
+MIGRATION_LOCK_KEY = 5303  # pg advisory lock id shared by all replicas
+
+Migration = namedtuple("Migration", "version name path checksum")
+
+_FILE_RE = re.compile(r"^(\d+)_(\w+)\.txt$")
+_INDEX_RE = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+_HISTORY_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version    INTEGER      PRIMARY KEY,
+        name       VARCHAR(100) NOT NULL,
+        checksum   CHAR(64)     NOT NULL,
+        applied_at TIMESTAMPTZ  NOT NULL DEFAULT now()
+    )
+"""
+
+
+class MigrationError(RuntimeError):
+    """The migration files and the database's recorded history disagree."""
+
+
+def _read(path):
+    with open(path, "r") as fp:
+        return fp.read()
+
+
+def load_migrations(migrations_dir):
+    """The migration files in version order; raises MigrationError on a repeated version."""
+    migrations = []
+    for file_name in sorted(os.listdir(migrations_dir)):
+        match = _FILE_RE.match(file_name)
+        if not match:
+            continue
+        path = os.path.join(migrations_dir, file_name)
+        checksum = hashlib.sha256(_read(path).encode()).hexdigest()
+        migrations.append(Migration(int(match.group(1)), match.group(2), path, checksum))
+    migrations.sort(key=lambda m: m.version)
+    for prev, cur in zip(migrations, migrations[1:]):
+        if prev.version == cur.version:
+            raise MigrationError(f"Duplicate migration version {cur.version}: {prev.name}, {cur.name}")
+    return migrations
+
+
+def applied_migrations(connection):
+    """{version: (name, checksum, applied_at)} recorded in schema_migrations.
+
+    Takes the migration advisory lock first, for the rest of the caller's
+    transaction, so replicas starting together on a fresh database do not
+    race to create the history table and the history read cannot be stale.
+    """
+    connection.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+    connection.execute(_HISTORY_DDL)
+    cursor = connection.cursor()
+    cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations")
+    applied = {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+    cursor.close()
+    return applied
+
+
+def status(pool, migrations_dir):
+    """(version, name, applied_at or None, checksum matches) for every migration file."""
+    migrations = load_migrations(migrations_dir)
+    with pool.connection() as connection:
+        applied = applied_migrations(connection)
+        connection.commit()
+    return [(m.version, m.name, applied[m.version][2] if m.version in applied else None,
+             m.version not in applied or applied[m.version][1] == m.checksum) for m in migrations]
+
+
+def apply(pool, migrations_dir):
+    """Apply pending migrations in version order; returns the "NNN_name" of each one applied.
+
+    Each migration and its history row commit together under an advisory
+    lock, and the history deciding what is pending is read under that same
+    lock, so replicas starting at once apply every version exactly once.
+    Raises MigrationError, before changing anything, if an applied file has
+    been edited since.
+    """
+    migrations = load_migrations(migrations_dir)
+    done = []
+    with pool.connection() as connection:
+        applied = applied_migrations(connection)
+        changed = [m for m in migrations if m.version in applied and applied[m.version][1] != m.checksum]
+        if changed:
+            connection.rollback()
+            raise MigrationError("Applied migrations were edited: " + ", ".join(f"{m.version:03d}_{m.name}" for m in changed))
+        for m in migrations:
+            if m.version in applied:
+                continue
+            cursor = connection.cursor()
+            cursor.execute(_read(m.path))
+            cursor.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                           (m.version, m.name, m.checksum))
+            cursor.close()
+            done.append(f"{m.version:03d}_{m.name}")
+            connection.commit()
+            # Committing released the lock: re-read the history under a new one
+            applied = applied_migrations(connection)
+        connection.commit()
+    return done
+
+
+def verify(pool, migrations_dir):
+    """Compare the database with the migration files; returns a list of problems (empty when in sync)."""
+    migrations = load_migrations(migrations_dir)
+    problems = []
+    with pool.connection() as connection:
+        applied = applied_migrations(connection)
+        known = {m.version for m in migrations}
+        for version in sorted(set(applied) - known):
+            problems.append(f"{version:03d}_{applied[version][0]}: applied but has no migration file")
+        cursor = connection.cursor()
+        for m in migrations:
+            label = f"{m.version:03d}_{m.name}"
+            if m.version not in applied:
+                problems.append(f"{label}: not applied")
+                continue
+            if applied[m.version][1] != m.checksum:
+                problems.append(f"{label}: file changed after it was applied")
+            for index in _INDEX_RE.findall(_read(m.path)):
+                cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (index,))
+                if not cursor.fetchone()[0]:
+                    problems.append(f"{label}: index {index} is missing")
+        cursor.close()
+        connection.commit()
+    return problems
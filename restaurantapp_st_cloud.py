@@ -3,15 +3,25 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
-from datetime import datetime, timedelta, date
+from datetime import datetime, timedelta
 import time
 import pytz
 import psycopg
+from psycopg import sql
+from psycopg_pool import ConnectionPool, PoolTimeout
 import os
-import re
 from dotenv import load_dotenv
 import logging
 import io
+import uuid
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+import stock_ledger
+import bulk_engine
+import sales_engine
+import migrations
+import db
 
 from streamlit.web import cli as stcli
 import sys
@@ -25,12 +35,10 @@ from email_validator import validate_email, EmailNotValidError
 # Define BASE_DIR for consistent file paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-FILES_DIR = os.environ.get('FILES_DIR', os.path.join(BASE_DIR, 'Files'))
-BULK_DIR = os.environ.get('BULK_DIR', os.path.join(BASE_DIR, 'Bulk_Import'))
-REPORTS_DIR = os.environ.get('REPORTS_DIR', os.path.join(BASE_DIR, 'reports'))
-os.makedirs(FILES_DIR, exist_ok=True)
-os.makedirs(BULK_DIR, exist_ok=True)
-os.makedirs(REPORTS_DIR, exist_ok=True)
+# Read-only SQL/DDL files. Uploads, logs and report exports never touch the
+# local disk, so any number of tasks can run behind the load balancer.
+FILES_DIR = db.FILES_DIR
+MIGRATIONS_DIR = db.MIGRATIONS_DIR
 
 load_dotenv()  # Load environment variables from .env file
 
@@ -43,242 +51,560 @@ SEND_ALERTS = os.environ.get('SEND_ALERTS', 'true').lower() == 'true'
 EMAIL_FROM = os.environ.get('EMAIL_FROM')
 SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
 
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+DASHBOARD_WORKERS = int(os.environ.get('DASHBOARD_WORKERS', 4))
+DASHBOARD_CONN_TIMEOUT = float(os.environ.get('DASHBOARD_CONN_TIMEOUT', 2))
+
+
+def _pool_reconnect_failed(pool):
+    logging.error(f"DB pool {pool.name}: reconnection attempts exhausted")
+
+
 @st.cache_resource
-def get_connection():
-    """Load DB credentials from environment variables and connect to PostgreSQL."""
-    host = os.environ.get('DB_HOST')
-    port = os.environ.get('DB_PORT', '6543')
-    dbname = os.environ.get('DB_NAME')
-    user = os.environ.get('DBP_USER')
-    password = os.environ.get('DBP_PASSWORD')
-    print("host=", host)
-    if not all([host, dbname, user, password]):
+def get_connection_pool():
+    """Load DB credentials from environment variables and open a PostgreSQL connection pool.
+
+    Helpers borrow a connection with ``with pool.connection() as connection:``.
+    The connection is health-checked on checkout, committed (or rolled back on
+    error) when the block exits and then returned, so one failed statement
+    never leaves a shared transaction aborted for other sessions.
+    """
+    kwargs = db.connection_kwargs(prepare_threshold=5 if use_server_prepare() else None)
+    print("host=", kwargs["host"])
+    if db.missing_settings(kwargs):
         st.error("Missing DB environment variables: DB_HOST, DB_NAME, DB_USER, DB_PASSWORD")
         return None
     try:
-        connection = psycopg.connect(
-            host=host,
-            port=port,
-            dbname=dbname,
-            user=user,
-            password=password,
-            sslmode='require', # For Supabase/SSL-enabled PG
-            prepare_threshold=None 
+        pool = ConnectionPool(
+            kwargs=kwargs,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            timeout=DB_POOL_TIMEOUT,
+            max_idle=DB_POOL_MAX_IDLE,
+            check=ConnectionPool.check_connection,
+            reconnect_failed=_pool_reconnect_failed,
+            name="restaurant-db",
+            open=False,
         )
+        pool.open(wait=True, timeout=DB_POOL_TIMEOUT)
         st.success("Connected to PostgreSQL Database!")
-        return connection
+        return pool
     except Exception as e:
         st.write(f"DB Connection Error: {e}")
         return None
 
 
-# --- Inlined Functions from Original App (Adapted for Streamlit) ---
+# --- Prepared statement catalog ---
+# "server" prepares catalog statements once per physical connection; "client" sends
+# them unprepared, which is what the Supabase transaction-mode pooler (port 6543)
+# needs because consecutive transactions may land on different backends.
+DB_PREPARE_MODE = os.environ.get('DB_PREPARE_MODE', 'auto').lower()
+
+_MENU_SQL = "SELECT ROW_NUMBER() OVER () rn, {name}, price, tax_category FROM {table} a WHERE {filter}a.{name} IN (SELECT b.item_name FROM stock_balance_vw b WHERE a.{name} = b.item_name AND value_date = CURRENT_DATE AND avail_stock > 0) AND a.delete_flag='N'"
+
+STATEMENT_CATALOG = {
+    "coffee_menu": _MENU_SQL.format(name="coffee_name", table="coffee_menu_tbl", filter=""),
+    "tea_menu": _MENU_SQL.format(name="tea_name", table="tea_menu_tbl", filter=""),
+    "chat_menu_veg": _MENU_SQL.format(name="chat_name", table="chat_menu_tbl", filter="category = 'VEG' AND "),
+    "chat_menu_nv": _MENU_SQL.format(name="chat_name", table="chat_menu_tbl", filter="category = 'NV' AND "),
+    "chat_menu_all": _MENU_SQL.format(name="chat_name", table="chat_menu_tbl", filter=""),
+    "reserve_item_stock": "WITH bal AS (SELECT avail_stock FROM stock_balance_vw WHERE value_date = CURRENT_DATE AND item_name = %(itm)s AND avail_stock >= %(qty)s), "
+                          "mv AS (INSERT INTO stock_movement_tbl (item_name, movement_type, quantity, reference) SELECT %(itm)s, 'SALE', -%(qty)s, %(sid)s FROM bal RETURNING movement_id), "
+                          "hold AS (INSERT INTO stock_reservation_tbl (session_id, value_date, item_name, quantity) SELECT %(sid)s, CURRENT_DATE, %(itm)s, %(qty)s FROM bal "
+                          "ON CONFLICT (session_id, value_date, item_name) DO UPDATE SET quantity = stock_reservation_tbl.quantity + EXCLUDED.quantity, last_touched = now()) "
+                          "SELECT bal.avail_stock - %(qty)s, mv.movement_id FROM bal, mv",
+    "release_reservation": "WITH rel AS (UPDATE stock_reservation_tbl SET quantity = quantity - %(qty)s, last_touched = now() WHERE session_id = %(sid)s AND value_date = CURRENT_DATE AND item_name = %(itm)s AND quantity >= %(qty)s RETURNING item_name), "
+                           "mv AS (INSERT INTO stock_movement_tbl (item_name, movement_type, quantity, reference) SELECT item_name, 'CANCEL', %(qty)s, %(sid)s FROM rel RETURNING item_name, movement_id) "
+                           "SELECT b.avail_stock + %(qty)s, mv.movement_id FROM stock_balance_vw b JOIN mv ON b.item_name = mv.item_name WHERE b.value_date = CURRENT_DATE",
+}
 
-def load_stock_txn_data(connection) :
-    rec_cnt = 0
-    
-    qry = "SELECT COUNT(*) cnt FROM STOCK_MAINTENANCE_TXN_TBL WHERE value_date = CURRENT_DATE"
-    ins_qry = "INSERT INTO STOCK_MAINTENANCE_TXN_TBL (value_date, item_name, avail_stock) SELECT CURRENT_DATE, item_name, total_stock FROM STOCK_MAINTENANCE_TBL WHERE delete_flag='N' "
-    
+
+def use_server_prepare():
+    if DB_PREPARE_MODE in ('server', 'client'):
+        return DB_PREPARE_MODE == 'server'
+    return os.environ.get('DB_PORT', '6543') != '6543'
+
+
+class StatementStats:
+    """Process-wide counters of how catalog statements were executed."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prepared = weakref.WeakKeyDictionary()  # connection -> names prepared on it
+        self.counts = {name: {"prepared": 0, "executions": 0, "unprepared": 0} for name in STATEMENT_CATALOG}
+
+    def record(self, connection, name, prepare):
+        with self._lock:
+            if not prepare:
+                self.counts[name]["unprepared"] += 1
+                return
+            self.counts[name]["executions"] += 1
+            names = self._prepared.setdefault(connection, set())
+            if name not in names:
+                names.add(name)
+                self.counts[name]["prepared"] += 1
+
+    def as_dataframe(self):
+        with self._lock:
+            rows = [[name, c["prepared"], c["executions"], c["unprepared"]] for name, c in self.counts.items()]
+        return pd.DataFrame(rows, columns=['Statement', 'Prepared', 'Executions', 'Unprepared'])
+
+
+@st.cache_resource
+def get_statement_stats():
+    return StatementStats()
+
+
+def execute_statement(connection, name, params=None):
+    """Execute a catalog statement on a borrowed connection and return the cursor."""
+    prepare = use_server_prepare()
     cursor = connection.cursor()
-    cursor.execute(qry)
-    row = cursor.fetchone()
-    rec_cnt = row[0] if row else 0
+    cursor.execute(STATEMENT_CATALOG[name], params, prepare=prepare)
+    get_statement_stats().record(connection, name, prepare)
+    return cursor
 
-    if rec_cnt == 0 :
-        cursor.execute(ins_qry)
-        connection.commit()
 
-def load_tax_data(connection):
+def execute_pipelined(connection, statements):
+    """Send independent statements in one network flight using psycopg pipeline mode.
+
+    statements is a list of (query, params) pairs; a query may also be a
+    STATEMENT_CATALOG name. Returns one entry per statement: its rows, or None
+    for statements that return no result set. The caller commits.
+    """
+    cursors = []
+    with connection.pipeline():
+        for query, params in statements:
+            if query in STATEMENT_CATALOG:
+                cursors.append(execute_statement(connection, query, params))
+            else:
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+                cursors.append(cursor)
+    results = []
+    for cursor in cursors:
+        results.append(cursor.fetchall() if cursor.description else None)
+        cursor.close()
+    return results
+
+
+# --- Inlined Functions from Original App (Adapted for Streamlit) ---
+
+DB_TIMEZONE = os.environ.get('DB_TIMEZONE', 'UTC')  # session timezone behind CURRENT_DATE
+
+def db_date():
+    """Today's date as the database sees it (CURRENT_DATE)."""
+    return datetime.now(pytz.timezone(DB_TIMEZONE)).date()
+
+def load_stock_txn_data(pool) :
+    """Copy STOCK_MAINTENANCE_TBL into today's STOCK_MAINTENANCE_TXN_TBL rows if missing."""
+    return stock_ledger.rollover_daily_stock(pool)
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def run_daily_stock_rollover(_pool, run_date):
+    """Run load_stock_txn_data once per process per business day (keyed on run_date)."""
+    rec_cnt = load_stock_txn_data(_pool)
+    logging.info(f"Stock rollover for {run_date}: {rec_cnt} items inserted")
+    return rec_cnt
+
+def load_tax_data(pool):
     """Load tax categories and rates."""
-    cursor = connection.cursor()
-    sel_tax_rec = "SELECT category_name, tax_slab FROM tax_maintenance_tbl"
-    cursor.execute(sel_tax_rec)
-    tax_data = {}
-    rows = cursor.fetchall()
-    for row in rows:
-        tax_data[row[0]] = row[1]
-    cursor.close()
-    return tax_data
-
-def get_stock_data(connection):
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        sel_tax_rec = "SELECT category_name, tax_slab FROM tax_maintenance_tbl"
+        cursor.execute(sel_tax_rec)
+        tax_data = {}
+        rows = cursor.fetchall()
+        for row in rows:
+            tax_data[row[0]] = row[1]
+        cursor.close()
+        return tax_data
+
+REFERENCE_DATA_TTL = int(os.environ.get('REFERENCE_DATA_TTL', 600))
+REFERENCE_PROBE_INTERVAL = int(os.environ.get('REFERENCE_PROBE_INTERVAL', 15))
+
+class ReferenceData:
+    """Versioned in-memory copy of slowly-changing reference tables.
+
+    get() is a dictionary hit until the table is invalidated (its version is
+    bumped) or REFERENCE_DATA_TTL expires, which bounds staleness when another
+    replica made the change. Tables built from a database table listed in
+    ROW_VERSIONED are also invalidated when its reference_version_tbl counter
+    moves, checked at most every REFERENCE_PROBE_INTERVAL seconds.
+    """
+
+    LOADERS = {
+        "tax_slabs": load_tax_data,
+        "weekdays": lambda pool: fetch_weekday(pool),
+        "bulk_catalog_index": bulk_engine.load_catalog_index,
+    }
+
+    # database table -> cached tables built from it
+    ROW_VERSIONED = {
+        "bulk_order_tbl": ("bulk_catalog_index",),
+    }
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._tables = {}  # name -> (version, loaded_at, data)
+        self.versions = {name: 0 for name in self.LOADERS}
+        self.hits = {name: 0 for name in self.LOADERS}
+        self.misses = {name: 0 for name in self.LOADERS}
+        self._row_versions = {}  # database table -> last seen reference_version_tbl counter
+        self._probed_at = None
+
+    def _check_row_versions(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._probed_at is not None and now - self._probed_at < REFERENCE_PROBE_INTERVAL:
+                return
+            self._probed_at = now
+        with self._pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT table_name, version FROM reference_version_tbl WHERE table_name = ANY(%s)",
+                           (list(self.ROW_VERSIONED),))
+            rows = cursor.fetchall()
+            cursor.close()
+        stale = []
+        with self._lock:
+            for table, row_version in rows:
+                seen = self._row_versions.get(table)
+                if seen is None or row_version > seen:
+                    # Counters only grow; an older probe finishing late must not move it back
+                    if seen is not None:
+                        stale.extend(self.ROW_VERSIONED[table])
+                    self._row_versions[table] = row_version
+        for name in stale:
+            self.invalidate(name)
+
+    def get(self, name):
+        if any(name in names for names in self.ROW_VERSIONED.values()):
+            self._check_row_versions()
+        with self._lock:
+            entry = self._tables.get(name)
+            if entry and entry[0] == self.versions[name] and time.monotonic() - entry[1] < REFERENCE_DATA_TTL:
+                self.hits[name] += 1
+                return entry[2]
+            self.misses[name] += 1
+            version = self.versions[name]
+        data = self.LOADERS[name](self._pool)
+        with self._lock:
+            # Only publish if nobody invalidated the table while it was loading
+            if self.versions[name] == version:
+                self._tables[name] = (version, time.monotonic(), data)
+        return data
+
+    def invalidate(self, name):
+        with self._lock:
+            self.versions[name] += 1
+            self._tables.pop(name, None)
+
+    def as_dataframe(self):
+        with self._lock:
+            rows = [[name, self.versions[name], self.hits[name], self.misses[name]] for name in self.LOADERS]
+        return pd.DataFrame(rows, columns=['Table', 'Version', 'Hits', 'Misses'])
+
+@st.cache_resource
+def get_reference_data(_pool):
+    return ReferenceData(_pool)
+
+def get_stock_data(pool):
     """Load stock for current date."""
-    cursor = connection.cursor()
-    sel_qry = "SELECT item_name, avail_stock FROM STOCK_MAINTENANCE_TXN_TBL WHERE value_date = CURRENT_DATE"
-    cursor.execute(sel_qry)
-    stock_rec = {}
-    rows = cursor.fetchall()
-    for rec in rows:
-        stock_rec[rec[0]] = int(rec[1])
-    cursor.close()
-    return stock_rec
-
-def get_shortage_stock_data(connection):
+    return stock_ledger.get_balances(pool)
+
+def get_shortage_stock_data(pool):
     """Load shortage stock for current date."""
-    cursor = connection.cursor()
-    sel_qry = "SELECT item_name, avail_stock FROM STOCK_MAINTENANCE_TXN_TBL WHERE value_date = CURRENT_DATE AND avail_stock = 0"
-    cursor.execute(sel_qry)
-    stock_rec = {}
-    rows = cursor.fetchall()
-    for rec in rows:
-        stock_rec[rec[0]] = int(rec[1])
-    cursor.close()
-    return stock_rec
-
-def load_shortage_stock_data(connection):
+    return stock_ledger.get_balances(pool, shortage_only=True)
+
+def load_shortage_stock_data(pool):
     """Load shortage stock for current date."""
-    cursor = connection.cursor()
-    upd_qry = "UPDATE STOCK_MAINTENANCE_TXN_TBL SET avail_stock=50 WHERE value_date = CURRENT_DATE AND avail_stock = 0"
-    cursor.execute(upd_qry)
-    connection.commit()
-    cursor.close()
+    return stock_ledger.replenish_shortages(pool, 50, reference="Load Stock")
 
-def update_stock_rec(connection, stock_rec):
-    """Update stock in DB."""
-    cursor = connection.cursor()
-    upd_qry = "UPDATE STOCK_MAINTENANCE_TXN_TBL SET avail_stock = %(qty)s WHERE value_date = CURRENT_DATE AND item_name = %(itm)s"
-    for itm, qty in stock_rec.items():
-        cursor.execute(upd_qry, {"qty": qty, "itm": itm})
-    connection.commit()
-    cursor.close()
-
-def update_tax_amt(connection,tax_category,tax_amount) :
-    category = str(tax_category)
-    amt = float(tax_amount)
-    cursor = connection.cursor()
-    
-    upd_qry = "UPDATE TAX_MAINTENANCE_TBL SET tax_slab = %(amt)s WHERE category_name = %(category)s"
-    try:
-        cursor.execute(upd_qry,{"amt" : amt, "category" : category})
+STOCK_SNAPSHOT_TTL = int(os.environ.get('STOCK_SNAPSHOT_TTL', 10))
+
+@st.cache_resource
+def get_stock_snapshot(_pool):
+    return stock_ledger.StockSnapshot(_pool, STOCK_SNAPSHOT_TTL, today=db_date)
+
+# --- Stock movement ledger ---
+# Stock changes are appended to stock_movement_tbl; a background thread folds them
+# into the daily STOCK_MAINTENANCE_TXN_TBL snapshot every STOCK_COMPACT_INTERVAL seconds.
+STOCK_COMPACT_INTERVAL = int(os.environ.get('STOCK_COMPACT_INTERVAL', 300))
+
+def _stock_compactor(pool):
+    while True:
+        time.sleep(STOCK_COMPACT_INTERVAL)
+        try:
+            rec_cnt = stock_ledger.compact(pool)
+            logging.info(f"Stock ledger compaction folded movements into {rec_cnt} snapshot rows")
+        except Exception as e:
+            logging.error(f"Stock ledger compaction error: {e}")
+
+@st.cache_resource
+def start_stock_ledger(_pool):
+    """Start the per-process ledger compaction thread."""
+    compactor = threading.Thread(target=_stock_compactor, args=(_pool,), name="stock-compactor", daemon=True)
+    compactor.start()
+    return compactor
+
+# --- Cart stock reservations ---
+# Each cart line is a timestamped hold in stock_reservation_tbl (one row per session
+# and item). Holds not touched for RESERVATION_TTL seconds are returned to stock by a
+# background sweeper; "Confirm & Insert Sales to DB" turns the holds into sales.
+RESERVATION_TTL = int(os.environ.get('RESERVATION_TTL', 900))
+RESERVATION_SWEEP_INTERVAL = int(os.environ.get('RESERVATION_SWEEP_INTERVAL', 60))
+
+def reserve_item_stock(pool, session_id, item, qty):
+    """Take qty of item from today's stock and hold it for the session, atomically.
+
+    Returns (new stock level, movement id), or None when the item would be oversold.
+    """
+    params = {"sid": session_id, "itm": item, "qty": int(qty)}
+    with pool.connection() as connection:
+        _, rows = execute_pipelined(connection, [stock_ledger.lock_item_statement(item), ("reserve_item_stock", params)])
         connection.commit()
-    except psycopg.Error as e:
-        st.error(f"DB Update Error: {e}")
-    cursor.close()
+    return (int(rows[0][0]), int(rows[0][1])) if rows else None
 
-def insert_db_data(connection, tmp_lis):
-    """Insert sales to DB."""
-    cursor = connection.cursor()
-    current_date = date.today().strftime("%d-%b-%Y").upper()
-    ins_rec = []
-    for idx in range(len(tmp_lis)):
-        ins_rec.append([current_date, str(tmp_lis[idx][0]), str(tmp_lis[idx][1]), str(tmp_lis[idx][2])])
-    insert_sales_rec = "INSERT INTO sales_dtl_tbl (value_date, item_name, quantity, sales_amt) VALUES (%s, %s, %s, %s)"
-    try:
-        cursor.executemany(insert_sales_rec, ins_rec)
+def release_reservation(pool, session_id, item, qty):
+    """Give back qty of the session's hold on item; returns (new stock level, movement id) or None if nothing was held."""
+    with pool.connection() as connection:
+        cursor = execute_statement(connection, "release_reservation", {"sid": session_id, "itm": item, "qty": int(qty)})
+        row = cursor.fetchone()
+        cursor.close()
         connection.commit()
-    except psycopg.Error as e:
-        st.error(f"DB Insert Error: {e}")
-    cursor.close()
+    return (int(row[0]), int(row[1])) if row else None
+
+def release_cart_stock(pool, session_id):
+    """Return every hold of a session to stock in one statement; returns {item: (new level, movement id)}."""
+    upd_qry = """
+        WITH rel AS (
+            DELETE FROM stock_reservation_tbl WHERE session_id = %(sid)s
+            RETURNING value_date, item_name, quantity
+        ), mv AS (
+            INSERT INTO stock_movement_tbl (value_date, item_name, movement_type, quantity, reference)
+            SELECT value_date, item_name, 'CANCEL', SUM(quantity), %(sid)s FROM rel
+            GROUP BY value_date, item_name HAVING SUM(quantity) > 0
+            RETURNING value_date, item_name, quantity, movement_id
+        )
+        SELECT mv.item_name, b.avail_stock + mv.quantity, mv.movement_id
+        FROM mv JOIN stock_balance_vw b ON b.value_date = mv.value_date AND b.item_name = mv.item_name
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(upd_qry, {"sid": session_id})
+        levels = {row[0]: (int(row[1]), int(row[2])) for row in cursor.fetchall()}
+        cursor.close()
+        connection.commit()
+    return levels
 
+def touch_reservations(pool, session_id):
+    """Keep the session's holds alive; returns {item: held qty} for what is still held."""
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("UPDATE stock_reservation_tbl SET last_touched = now() WHERE session_id = %(sid)s AND quantity > 0 RETURNING item_name, quantity", {"sid": session_id})
+        held = {row[0]: int(row[1]) for row in cursor.fetchall()}
+        cursor.close()
+        connection.commit()
+    return held
+
+def sweep_expired_reservations(pool):
+    """Return expired (or emptied) holds to stock; returns the number of holds swept."""
+    sweep_qry = """
+        WITH expired AS (
+            DELETE FROM stock_reservation_tbl
+            WHERE last_touched < now() - make_interval(secs => %(ttl)s) OR quantity <= 0
+            RETURNING value_date, item_name, quantity
+        ), restored AS (
+            INSERT INTO stock_movement_tbl (value_date, item_name, movement_type, quantity, reference)
+            SELECT value_date, item_name, 'CANCEL', SUM(quantity), 'reservation expiry' FROM expired
+            GROUP BY value_date, item_name HAVING SUM(quantity) > 0
+        )
+        SELECT COUNT(*) FROM expired
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(sweep_qry, {"ttl": RESERVATION_TTL})
+        swept = cursor.fetchone()[0]
+        cursor.close()
+        connection.commit()
+    return swept
 
-def fetch_coffee(connection):
-    coffee_lis = []
+def _reservation_sweeper(pool):
+    while True:
+        time.sleep(RESERVATION_SWEEP_INTERVAL)
+        try:
+            swept = sweep_expired_reservations(pool)
+            if swept:
+                logging.info(f"Reservation sweeper returned {swept} expired holds to stock")
+                get_stock_snapshot(pool).invalidate()
+                invalidate_menu_cache()
+        except Exception as e:
+            logging.error(f"Reservation sweeper error: {e}")
+
+@st.cache_resource
+def start_reservation_sweeper(_pool):
+    """Start the per-process reservation sweeper thread."""
+    sweeper = threading.Thread(target=_reservation_sweeper, args=(_pool,), name="reservation-sweeper", daemon=True)
+    sweeper.start()
+    return sweeper
+
+def update_tax_amt(pool,tax_category,tax_amount) :
+    with pool.connection() as connection:
+        category = str(tax_category)
+        amt = float(tax_amount)
+        cursor = connection.cursor()
     
-    cursor = connection.cursor()
-    sel_qry = "select coffee_name from coffee_menu_tbl where delete_flag='N'"
-    cursor.execute(sel_qry)
-    row = cursor.fetchone()
-    while row:
-        coffee_lis.append(row[0])
+        upd_qry = "UPDATE TAX_MAINTENANCE_TBL SET tax_slab = %(amt)s WHERE category_name = %(category)s"
+        try:
+            cursor.execute(upd_qry,{"amt" : amt, "category" : category})
+            connection.commit()
+        except psycopg.Error as e:
+            st.error(f"DB Update Error: {e}")
+        cursor.close()
+    get_reference_data(pool).invalidate("tax_slabs")
+
+def insert_db_data(pool, tmp_lis, session_id=None):
+    """Insert sales to DB; with session_id, the session's stock holds are consumed in the same transaction."""
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        try:
+            bulk_engine.insert_sales_rows(connection, tmp_lis)
+            if session_id:
+                cursor.execute("DELETE FROM stock_reservation_tbl WHERE session_id = %(sid)s", {"sid": session_id})
+            connection.commit()
+        except psycopg.Error as e:
+            st.error(f"DB Insert Error: {e}")
+        cursor.close()
+
+
+def fetch_coffee(pool):
+    with pool.connection() as connection:
+        coffee_lis = []
+    
+        cursor = connection.cursor()
+        sel_qry = "select coffee_name from coffee_menu_tbl where delete_flag='N'"
+        cursor.execute(sel_qry)
         row = cursor.fetchone()
+        while row:
+            coffee_lis.append(row[0])
+            row = cursor.fetchone()
 
-    return coffee_lis
+        return coffee_lis
 
-def fetch_tea(connection):
-    tea_lis = []
+def fetch_tea(pool):
+    with pool.connection() as connection:
+        tea_lis = []
     
-    cursor = connection.cursor()
-    sel_qry = "select tea_name from tea_menu_tbl where delete_flag='N'"
-    cursor.execute(sel_qry)
-    row = cursor.fetchone()
-    while row:
-        tea_lis.append(row[0])
+        cursor = connection.cursor()
+        sel_qry = "select tea_name from tea_menu_tbl where delete_flag='N'"
+        cursor.execute(sel_qry)
         row = cursor.fetchone()
+        while row:
+            tea_lis.append(row[0])
+            row = cursor.fetchone()
 
-    return tea_lis
+        return tea_lis
 
-def fetch_chat(connection):
-    chat_lis = []
+def fetch_chat(pool):
+    with pool.connection() as connection:
+        chat_lis = []
     
-    cursor = connection.cursor()
-    sel_qry = "select chat_name from chat_menu_tbl where delete_flag='N'"
-    cursor.execute(sel_qry)
-    row = cursor.fetchone()
-    while row:
-        chat_lis.append(row[0])
+        cursor = connection.cursor()
+        sel_qry = "select chat_name from chat_menu_tbl where delete_flag='N'"
+        cursor.execute(sel_qry)
         row = cursor.fetchone()
+        while row:
+            chat_lis.append(row[0])
+            row = cursor.fetchone()
 
-    return chat_lis
+        return chat_lis
 
-def fetch_weekday_item(connection, cat):
-    item_list = []
-    cursor = connection.cursor()
-    sel_qry = "select  item_name, weekday from weekday_special_tbl where category = %(cat)s and delete_flag='N'"
-    cursor.execute(sel_qry, {"cat" : cat})
-    row = cursor.fetchone()
-    while row:
-        item_list.append([row[0],row[1]])
+def fetch_weekday_item(pool, cat):
+    with pool.connection() as connection:
+        item_list = []
+        cursor = connection.cursor()
+        sel_qry = "select  item_name, weekday from weekday_special_tbl where category = %(cat)s and delete_flag='N'"
+        cursor.execute(sel_qry, {"cat" : cat})
         row = cursor.fetchone()
+        while row:
+            item_list.append([row[0],row[1]])
+            row = cursor.fetchone()
 
-    return item_list
+        return item_list
     
 
-def fetch_weekday(connection):
-    weekday_lis = []
+def fetch_weekday(pool):
+    with pool.connection() as connection:
+        weekday_lis = []
 
-    cursor = connection.cursor()
-    sel_qry = "select weekday from weekdays_tbl"
-    cursor.execute(sel_qry)
-    row = cursor.fetchone()
-    while row:
-        weekday_lis.append(row[0])
+        cursor = connection.cursor()
+        sel_qry = "select weekday from weekdays_tbl"
+        cursor.execute(sel_qry)
         row = cursor.fetchone()
+        while row:
+            weekday_lis.append(row[0])
+            row = cursor.fetchone()
 
-    return weekday_lis
+        return weekday_lis
 
-def load_weekday_data(connection,item_selected,category,day_selected,del_flg):
-    cursor = connection.cursor()
-    ins_qry = "insert into weekday_special_tbl (item_name, category, weekday, delete_flag) values (%s,%s,%s,%s)"
-    cursor.execute(ins_qry, (item_selected,category,day_selected,del_flg))
-    connection.commit()
-    cursor.close()
+def load_weekday_data(pool,item_selected,category,day_selected,del_flg):
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        ins_qry = "insert into weekday_special_tbl (item_name, category, weekday, delete_flag) values (%s,%s,%s,%s)"
+        cursor.execute(ins_qry, (item_selected,category,day_selected,del_flg))
+        connection.commit()
+        cursor.close()
 
 
-def upd_weekday_data(connection,item_selected,wkday,del_flg):
-    cursor = connection.cursor()
-    upd_qry = "update weekday_special_tbl set delete_flag = %(del_flg)s where item_name = %(item_selected)s  and weekday = %(wkday)s "
-    cursor.execute(upd_qry,{"item_selected" : item_selected, "wkday" : wkday, "del_flg" : del_flg})
+def upd_weekday_data(pool,item_selected,wkday,del_flg):
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        upd_qry = "update weekday_special_tbl set delete_flag = %(del_flg)s where item_name = %(item_selected)s  and weekday = %(wkday)s "
+        cursor.execute(upd_qry,{"item_selected" : item_selected, "wkday" : wkday, "del_flg" : del_flg})
     
-    connection.commit()
-    cursor.close()
+        connection.commit()
+        cursor.close()
 
-def update_weekday_data(connection,item_selected,pwkday,wkday,del_flg):
-    cursor = connection.cursor()
-    upd_qry = "update weekday_special_tbl set delete_flag = %(del_flg)s , weekday = %(wkday)s where item_name = %(item_selected)s and  weekday = %(pwkday)s   "
-    cursor.execute(upd_qry,{"item_selected" : item_selected, "wkday" : wkday,"pwkday" : pwkday, "del_flg" : del_flg})
-    connection.commit()
-    cursor.close()
+def update_weekday_data(pool,item_selected,pwkday,wkday,del_flg):
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        upd_qry = "update weekday_special_tbl set delete_flag = %(del_flg)s , weekday = %(wkday)s where item_name = %(item_selected)s and  weekday = %(pwkday)s   "
+        cursor.execute(upd_qry,{"item_selected" : item_selected, "wkday" : wkday,"pwkday" : pwkday, "del_flg" : del_flg})
+        connection.commit()
+        cursor.close()
     
-def fetch_weekday_spl_df(connection, ctg):
-    cursor = connection.cursor()
-    sel_qry = "select distinct item_name, weekday from weekday_special_tbl where category = %(ctg)s and  delete_flag='N'"
-    cursor.execute(sel_qry, {"ctg" : ctg})
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item_name', 'weekday'])
-    cursor.close()
-    return df
+def fetch_weekday_spl_df(pool, ctg):
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        sel_qry = "select distinct item_name, weekday from weekday_special_tbl where category = %(ctg)s and  delete_flag='N'"
+        cursor.execute(sel_qry, {"ctg" : ctg})
+        rows = cursor.fetchall()
+        df = pd.DataFrame(rows, columns=['Item_name', 'weekday'])
+        cursor.close()
+        return df
 
-def get_today_spl(connection):
-    cursor = connection.cursor()
-    sel_qry = "select distinct item_name, category from weekday_special_tbl where  delete_flag='N' and lower(trim(weekday)) = lower(to_char(current_date, 'FMDay'))"
-    cursor.execute(sel_qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item_name','Category'])
-    cursor.close()
-    return df
+def business_date():
+    """Current date at the restaurant (IST), used to key once-per-day work."""
+    return datetime.now(pytz.timezone("Asia/Kolkata")).date()
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def get_today_spl(_pool, run_date):
+    """Specials for run_date; cached per date, so it is re-read after local midnight."""
+    with _pool.connection() as connection:
+        cursor = connection.cursor()
+        sel_qry = "select distinct item_name, category from weekday_special_tbl where  delete_flag='N' and lower(trim(weekday)) = lower(%(day)s)"
+        cursor.execute(sel_qry, {"day" : run_date.strftime("%A")})
+        rows = cursor.fetchall()
+        df = pd.DataFrame(rows, columns=['Item_name','Category'])
+        cursor.close()
+        return df
 
 
-def update_spl_item(connection, ctg):
+def spl_item_statements(ctg, weekday):
+    """The two UPDATEs that hide other days' specials and show weekday's specials for a category."""
     match ctg:
         case 'Coffee':
             table_name = "coffee_menu_tbl"
@@ -290,500 +616,275 @@ def update_spl_item(connection, ctg):
             table_name = "chat_menu_tbl"
             item_name = "chat_name"
             
-    cursor = connection.cursor()
     upd_qry11 = f"update {table_name} set delete_flag='Y' where {item_name} in (select item_name from weekday_special_tbl where category= %(ctg)s  and delete_flag='N'"
-    upd_qry12 = " and upper(trim(weekday)) != upper(trim(to_char(current_date,'day'))))"
+    upd_qry12 = " and upper(trim(weekday)) != upper(trim(%(day)s)))"
     update_qry1 = upd_qry11+upd_qry12
-    cursor.execute(update_qry1, {"ctg" : ctg})
-    connection.commit()
-    cursor.close()
-
-    cursor = connection.cursor()
 
     upd_qry21 = f"update {table_name} set delete_flag='N' where {item_name} in (select item_name from weekday_special_tbl where category= %(ctg)s  and delete_flag='N'"
-    upd_qry22 = " and upper(trim(weekday)) = upper(trim(to_char(current_date,'day'))))"
+    upd_qry22 = " and upper(trim(weekday)) = upper(trim(%(day)s)))"
     update_qry2 = upd_qry21+upd_qry22
-    cursor.execute(update_qry2, {"ctg" : ctg})
-    
-    connection.commit()
-    cursor.close()
+
+    params = {"ctg" : ctg, "day" : weekday}
+    return [(update_qry1, params), (update_qry2, params)]
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def activate_daily_specials(_pool, run_date):
+    """Apply the weekday_special_tbl schedule to the menu tables once per day per process.
+
+    Keyed on run_date, so later reruns that day are dictionary hits and only read
+    the menus. All six UPDATEs go out in one pipeline and one commit.
+    """
+    weekday = run_date.strftime("%A")
+    statements = []
+    for ctg in ("Coffee", "Tea", "Chat"):
+        statements.extend(spl_item_statements(ctg, weekday))
+    with _pool.connection() as connection:
+        execute_pipelined(connection, statements)
+        connection.commit()
+    invalidate_menu_cache()
+    logging.info(f"Weekday specials activated for {run_date} ({weekday})")
+    return True
+
+def refresh_daily_specials():
+    """Re-run today's specials activation after the schedule is edited."""
+    activate_daily_specials.clear()
+    get_today_spl.clear()
     
 
-def fetch_coffee_df(connection):
+def fetch_coffee_df(pool):
     """Fetch available coffee menu."""
-    cursor = connection.cursor()
-    sel_qry1 = "SELECT ROW_NUMBER() OVER () rn, coffee_name, price, tax_category FROM coffee_menu_tbl a WHERE a.coffee_name IN (SELECT b.item_name FROM STOCK_MAINTENANCE_TXN_TBL b "
-    sel_qry2 = "WHERE a.coffee_name=b.item_name AND value_date = CURRENT_DATE AND avail_stock > 0) AND delete_flag='N'"
-    cursor.execute(sel_qry1 + sel_qry2)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['ItemNo', 'Name', 'Price', 'TaxCategory'])
-    cursor.close()
-    return df
+    with pool.connection() as connection:
+        cursor = execute_statement(connection, "coffee_menu")
+        rows = cursor.fetchall()
+        df = pd.DataFrame(rows, columns=['ItemNo', 'Name', 'Price', 'TaxCategory'])
+        cursor.close()
+        return df
 
-def fetch_tea_df(connection):
+def fetch_tea_df(pool):
     """Fetch available tea menu."""
-    cursor = connection.cursor()
-    sel_qry1 = "SELECT ROW_NUMBER() OVER () rn, tea_name, price, tax_category FROM tea_menu_tbl a WHERE a.tea_name IN (SELECT b.item_name FROM STOCK_MAINTENANCE_TXN_TBL b "
-    sel_qry2 = "WHERE a.tea_name=b.item_name AND value_date = CURRENT_DATE AND avail_stock > 0) AND delete_flag='N'"
-    cursor.execute(sel_qry1 + sel_qry2)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['ItemNo', 'Name', 'Price', 'TaxCategory'])
-    cursor.close()
-    return df
+    with pool.connection() as connection:
+        cursor = execute_statement(connection, "tea_menu")
+        rows = cursor.fetchall()
+        df = pd.DataFrame(rows, columns=['ItemNo', 'Name', 'Price', 'TaxCategory'])
+        cursor.close()
+        return df
 
-def fetch_chat_df(connection, category):
+def fetch_chat_df(pool, category):
     """Fetch chat menu (Veg/Non-Veg/Both)."""
-    cursor = connection.cursor()
-    if category == "VEG":
-        select_rec = "SELECT ROW_NUMBER() OVER () rn, chat_name, price, tax_category FROM chat_menu_tbl a WHERE category = 'VEG' AND a.chat_name IN (SELECT b.item_name FROM STOCK_MAINTENANCE_TXN_TBL b WHERE a.chat_name = b.item_name AND value_date = CURRENT_DATE AND avail_stock > 0) AND a.delete_flag='N'"
-    elif category == "NV":
-        select_rec = "SELECT ROW_NUMBER() OVER () rn, chat_name, price, tax_category FROM chat_menu_tbl a WHERE category = 'NV' AND a.chat_name IN (SELECT b.item_name FROM STOCK_MAINTENANCE_TXN_TBL b WHERE a.chat_name = b.item_name AND value_date = CURRENT_DATE AND avail_stock > 0) AND a.delete_flag='N'"
-    else : 
-        select_rec = "SELECT ROW_NUMBER() OVER () rn, chat_name, price, tax_category FROM chat_menu_tbl a WHERE a.chat_name IN (SELECT b.item_name FROM STOCK_MAINTENANCE_TXN_TBL b WHERE a.chat_name = b.item_name AND value_date = CURRENT_DATE AND avail_stock > 0) AND a.delete_flag='N'"
-    cursor.execute(select_rec)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['ItemNo', 'Name', 'Price', 'TaxCategory'])
-    cursor.close()
-    return df
+    with pool.connection() as connection:
+        if category == "VEG":
+            cursor = execute_statement(connection, "chat_menu_veg")
+        elif category == "NV":
+            cursor = execute_statement(connection, "chat_menu_nv")
+        else : 
+            cursor = execute_statement(connection, "chat_menu_all")
+        rows = cursor.fetchall()
+        df = pd.DataFrame(rows, columns=['ItemNo', 'Name', 'Price', 'TaxCategory'])
+        cursor.close()
+        return df
 
 def check_time():
     """Check if current time is within special menu hours (17:00-19:00)."""
-    local_time = datetime.now(pytz.timezone("Asia/Kolkata"))
-    HH = int(local_time.strftime("%H"))
-    return 1 if 17 <= HH <= 19 else 0
+    return 1 if bulk_engine.spl_window_open() else 0
 
-def fetch_spl_df(connection):
+def fetch_spl_df(pool):
     """Fetch special snacks menu if within time."""
-    
     if check_time() == 0:
         return pd.DataFrame()
-    cursor = connection.cursor()
-    sel_qry = "SELECT ROW_NUMBER() OVER () rn, item_name, price, tax_category FROM special_snacks_tbl WHERE delete_flag='N'"
-    cursor.execute(sel_qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['ItemNo', 'Name', 'Price', 'TaxCategory'])
-    cursor.close()
-    return df
+    return get_menu_df(pool, "Snacks")
 
-def fetch_snack_df(connection):
+def fetch_snack_df(pool):
     """Fetch special snacks menu for maintenance"""
-    cursor = connection.cursor()
-    sel_qry = "SELECT ROW_NUMBER() OVER () rn, item_name, price, tax_category FROM special_snacks_tbl WHERE delete_flag='N'"
-    cursor.execute(sel_qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['ItemNo', 'Name', 'Price', 'TaxCategory'])
-    cursor.close()
-    return df
-
-def coffee_sales_fig(connection, period):
-    """Generate coffee sales chart."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE item_name IN (SELECT coffee_name FROM coffee_menu_tbl) AND value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' AND item_name IN (SELECT coffee_name FROM coffee_menu_tbl) GROUP BY item_name"
-    else:  # monthly
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' AND item_name IN (SELECT coffee_name FROM coffee_menu_tbl) GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-    if not df.empty:
-        fig, ax = plt.subplots()
-        df.plot(kind='bar', x='Item', y='Quantity', ax=ax, color=plt.cm.Set3(np.linspace(0, 1, len(df))),title=f'Coffee Sales ({period.capitalize()})')
-        ax.set_xlabel('Coffee Flavor')
-        ax.set_ylabel('Sales Quantity')
-        return fig
-    return None
-
-def coffee_sales_data(connection, period):
-    """Generate coffee sales chart."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE item_name IN (SELECT coffee_name FROM coffee_menu_tbl) AND value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' AND item_name IN (SELECT coffee_name FROM coffee_menu_tbl) GROUP BY item_name"
-    else:  # monthly
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' AND item_name IN (SELECT coffee_name FROM coffee_menu_tbl) GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    if not df.empty:
-        return df
-    return None
-
-def tea_sales_fig(connection, period='daily'):
-    """Generate tea sales chart (similar to coffee)."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE item_name IN (SELECT tea_name FROM tea_menu_tbl) AND value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' AND item_name IN (SELECT tea_name FROM tea_menu_tbl) GROUP BY item_name"
-    else:
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' AND item_name IN (SELECT tea_name FROM tea_menu_tbl) GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-    if not df.empty:
-        fig, ax = plt.subplots()
-        df.plot(kind='bar', x='Item', y='Quantity', ax=ax,color=plt.cm.Set3(np.linspace(0, 1, len(df))), title=f'Tea Sales ({period.capitalize()})')
-        ax.set_xlabel('Tea Type')
-        ax.set_ylabel('Sales Quantity')
-        return fig
-    return None
-
-def tea_sales_data(connection, period='daily'):
-    """Generate tea sales chart (similar to coffee)."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE item_name IN (SELECT tea_name FROM tea_menu_tbl) AND value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' AND item_name IN (SELECT tea_name FROM tea_menu_tbl) GROUP BY item_name"
-    else:
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' AND item_name IN (SELECT tea_name FROM tea_menu_tbl) GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    if not df.empty:
-        return df
-    return None
-
-def chat_sales_fig(connection, period='daily'):
-    """Generate chat sales chart (similar to coffee)."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE item_name IN (SELECT chat_name FROM chat_menu_tbl) AND value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' AND item_name IN (SELECT chat_name FROM chat_menu_tbl) GROUP BY item_name"
-    else:
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' AND item_name IN (SELECT chat_name FROM chat_menu_tbl) GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-    if not df.empty:
-        fig, ax = plt.subplots()
-        df.plot(kind='bar', x='Item', y='Quantity', ax=ax, color=plt.cm.Set3(np.linspace(0, 1, len(df))), title=f'Chat Sales ({period.capitalize()})')
-        ax.set_xlabel('Chat Type')
-        ax.set_ylabel('Sales Quantity')
-        return fig
-    return None
-
-def chat_sales_data(connection, period='daily'):
-    """Generate chat sales chart (similar to coffee)."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE item_name IN (SELECT chat_name FROM chat_menu_tbl) AND value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' AND item_name IN (SELECT chat_name FROM chat_menu_tbl) GROUP BY item_name"
-    else:
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' AND item_name IN (SELECT chat_name FROM chat_menu_tbl) GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    if not df.empty:
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        sel_qry = "SELECT ROW_NUMBER() OVER () rn, item_name, price, tax_category FROM special_snacks_tbl WHERE delete_flag='N'"
+        cursor.execute(sel_qry)
+        rows = cursor.fetchall()
+        df = pd.DataFrame(rows, columns=['ItemNo', 'Name', 'Price', 'TaxCategory'])
+        cursor.close()
         return df
-    return None
 
-def Spl_sales_fig(connection, period='daily'):
-    """Generate snacks sales chart (similar to coffee)."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE item_name IN (SELECT item_name FROM special_snacks_tbl) AND value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' AND item_name IN (SELECT item_name FROM special_snacks_tbl) GROUP BY item_name"
-    else:
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' AND item_name IN (SELECT item_name FROM special_snacks_tbl) GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-    if not df.empty:
-        fig, ax = plt.subplots()
-        df.plot(kind='bar', x='Item', y='Quantity', ax=ax, color=plt.cm.Set3(np.linspace(0, 1, len(df))), title=f'Snacks Sales ({period.capitalize()})')
-        ax.set_xlabel('Snack Type')
-        ax.set_ylabel('Sales Quantity')
-        return fig
-    return None
-
-def Spl_sales_data(connection, period='daily'):
-    """Generate snacks sales chart (similar to coffee)."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE item_name IN (SELECT item_name FROM special_snacks_tbl) AND value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' AND item_name IN (SELECT item_name FROM special_snacks_tbl) GROUP BY item_name"
-    else:
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' AND item_name IN (SELECT item_name FROM special_snacks_tbl) GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    if not df.empty:
-        return df
-    return None
+MENU_CACHE_TTL = int(os.environ.get('MENU_CACHE_TTL', 300))
 
-def pull_week_data(connection) :
-    current_date = datetime.today()
-    start_of_week = current_date - timedelta(days=current_date.weekday())
-    start_date = start_of_week.date()
+@st.cache_data(ttl=MENU_CACHE_TTL, show_spinner=False)
+def get_menu_df(_pool, menu, category=None):
+    """Customer menu served from memory; rebuilt after MENU_CACHE_TTL seconds or invalidate_menu_cache()."""
+    if menu == "Coffee":
+        return fetch_coffee_df(_pool)
+    elif menu == "Tea":
+        return fetch_tea_df(_pool)
+    elif menu == "Chat":
+        return fetch_chat_df(_pool, category)
+    return fetch_snack_df(_pool)
 
-    week_start_date = start_date.strftime("%d-%b-%Y").upper()
+def invalidate_menu_cache():
+    """Drop cached customer menus after a committed menu, price or stock change."""
+    get_menu_df.clear()
 
-    sel_qry1 = "SELECT SUBSTRING(REPLACE(TO_CHAR(value_date, 'DD Mon'), ' ', '-'), 1, 6) AS day, item_name, quantity, SUM(sales_amt) tot_sales FROM sales_dtl_tbl "
-    sel_qry2 = "WHERE value_date >= %s GROUP BY value_date, item_name, quantity ORDER BY 1,2"
-    final_qry = sel_qry1 + sel_qry2
+def pull_week_data(pool) :
+    with pool.connection() as connection:
+        current_date = datetime.today()
+        start_of_week = current_date - timedelta(days=current_date.weekday())
+        start_date = start_of_week.date()
 
-    cursor = connection.cursor()
-    cursor.execute(final_qry, (week_start_date,))
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns =['Day','Item','Quantity','Tot.Sales'])
-    cursor.close()
-    return df
+        week_start_date = start_date.strftime("%d-%b-%Y").upper()
 
-def execute_qry(connection, qry_str,column_names) :
-    cursor = connection.cursor()
-    cursor.execute(qry_str)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns = column_names)
-    cursor.close()
-    return df
+        sel_qry1 = "SELECT SUBSTRING(REPLACE(TO_CHAR(value_date, 'DD Mon'), ' ', '-'), 1, 6) AS day, item_name, quantity, SUM(sales_amt) tot_sales FROM sales_dtl_tbl "
+        sel_qry2 = "WHERE value_date >= %s GROUP BY value_date, item_name, quantity ORDER BY 1,2"
+        final_qry = sel_qry1 + sel_qry2
 
-def pull_month_data(connection):
-    path = os.path.join(FILES_DIR, "pg_week_wise_sales.txt")
-    with open(path, "r") as fp:
-        qry = fp.read()
-    cursor = connection.cursor()
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['WeekNo', 'Category', 'Item', 'Tot.Quantity', 'Tot.Sales'])
-    cursor.close()
-    return df
+        cursor = connection.cursor()
+        cursor.execute(final_qry, (week_start_date,))
+        rows = cursor.fetchall()
+        df = pd.DataFrame(rows, columns =['Day','Item','Quantity','Tot.Sales'])
+        cursor.close()
+        return df
 
-def get_month_data(connection) :
-    item_lis = []
-    path = os.path.join(BASE_DIR, "Files", "pg_week_wise_sales.txt")
-    fp = open(path,"r")
-    cursor = connection.cursor()
-    qry = fp.read()
-    fp.close()
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    for row in rows:
-        item_lis.append(row)
-    cursor.close()
-    return item_lis
-
-def overall_sales_fig(connection, period='daily'):
-    """Generate overall sales chart (similar to coffee)."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' GROUP BY item_name"
-    else:
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-    if not df.empty:
-        fig, ax = plt.subplots()
-        df.plot(kind='bar', x='Item', y='Quantity', ax=ax,color=plt.cm.Set3(np.linspace(0, 1, len(df))), title=f'OverAll Sales ({period.capitalize()})')
-        ax.set_xlabel('Item Type')
-        ax.set_ylabel('Sales Quantity')
-        return fig
-    return None
-
-def overall_sales_data(connection, period='daily'):
-    """Generate overall sales chart (similar to coffee)."""
-    cursor = connection.cursor()
-    if period == 'Daily':
-        qry = "SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date = CURRENT_DATE GROUP BY item_name"
-    elif period == 'Weekly':
-        week_start = (datetime.now() - timedelta(days=datetime.now().weekday())).strftime("%d-%b-%Y").upper()
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE value_date >= '{week_start}' GROUP BY item_name"
-    else:
-        year_month = datetime.now().strftime("%Y-%m")
-        qry = f"SELECT item_name, SUM(quantity) as qty FROM sales_dtl_tbl WHERE TO_CHAR(value_date, 'YYYY-MM') = '{year_month}' GROUP BY item_name"
-    cursor.execute(qry)
-    rows = cursor.fetchall()
-    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
-    cursor.close()
-    if not df.empty:
+def execute_qry(pool, qry_str,column_names) :
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(qry_str)
+        rows = cursor.fetchall()
+        df = pd.DataFrame(rows, columns = column_names)
+        cursor.close()
         return df
-    return None
 
-def Week_sale_items(connection) :
-    item_lis = []
-    
-    current_date = datetime.today()
-    start_of_week = current_date - timedelta(days=current_date.weekday())
-    start_date = start_of_week.date()
+def excel_bytes(df, sheet_name='Sheet1'):
+    """Render a DataFrame as an .xlsx file in memory for st.download_button."""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name=sheet_name)
+    return output.getvalue()
+
+def pull_month_data(pool):
+    with pool.connection() as connection:
+        path = os.path.join(FILES_DIR, "pg_week_wise_sales.txt")
+        with open(path, "r") as fp:
+            qry = fp.read()
+        cursor = connection.cursor()
+        cursor.execute(qry)
+        rows = cursor.fetchall()
+        df = pd.DataFrame(rows, columns=['WeekNo', 'Category', 'Item', 'Tot.Quantity', 'Tot.Sales'])
+        cursor.close()
+        return df
 
-    week_start_date = start_date.strftime("%d-%b-%Y").upper()
-    
-    cursor = connection.cursor()
+def get_month_data(pool) :
+    with pool.connection() as connection:
+        item_lis = []
+        path = os.path.join(BASE_DIR, "Files", "pg_week_wise_sales.txt")
+        fp = open(path,"r")
+        cursor = connection.cursor()
+        qry = fp.read()
+        fp.close()
+        cursor.execute(qry)
+        rows = cursor.fetchall()
+        for row in rows:
+            item_lis.append(row)
+        cursor.close()
+        return item_lis
 
-    sel_qry1 = "SELECT SUBSTRING(REPLACE(TO_CHAR(value_date, 'DD Mon'), ' ', '-'), 1, 6) AS day, 'Coffee' item_name, SUM(sales_amt) tot_sales FROM sales_dtl_tbl "
-    sel_qry2 = "WHERE value_date >= %s AND item_name IN (SELECT coffee_name FROM coffee_menu_tbl) GROUP BY value_date, item_name "
-    sel_qry3 = "UNION SELECT SUBSTRING(REPLACE(TO_CHAR(value_date, 'DD Mon'), ' ', '-'), 1, 6) AS day, 'Tea' item_name, SUM(sales_amt) tot_sales FROM sales_dtl_tbl "
-    sel_qry4 = "WHERE value_date >= %s AND item_name IN (SELECT tea_name FROM tea_menu_tbl) GROUP BY value_date, item_name "
-    sel_qry5 = "UNION SELECT SUBSTRING(REPLACE(TO_CHAR(value_date, 'DD Mon'), ' ', '-'), 1, 6) AS day, 'Chat' item_name, SUM(sales_amt) tot_sales FROM sales_dtl_tbl "
-    sel_qry6 = "WHERE value_date >= %s AND item_name IN (SELECT chat_name FROM chat_menu_tbl) GROUP BY value_date, item_name "
-    sel_qry7 = "UNION SELECT SUBSTRING(REPLACE(TO_CHAR(value_date, 'DD Mon'), ' ', '-'), 1, 6) AS day, 'Snacks' item_name, SUM(sales_amt) tot_sales FROM sales_dtl_tbl "
-    sel_qry8 = "WHERE value_date >= %s AND item_name IN (SELECT item_name FROM special_snacks_tbl) GROUP BY value_date, item_name"
+def Week_sale_items(pool) :
+    """(day, category, sales) for each category sold this week, from the daily rollup."""
+    with pool.connection() as connection:
+        item_lis = []
     
-    final_qry = sel_qry1 + sel_qry2 + sel_qry3 + sel_qry4 + sel_qry5 + sel_qry6 + sel_qry7 + sel_qry8
+        current_date = datetime.today()
+        start_of_week = current_date - timedelta(days=current_date.weekday())
+        start_date = start_of_week.date()
 
-    cursor.execute(final_qry, (week_start_date, week_start_date, week_start_date, week_start_date))
+        cursor = connection.cursor()
 
-    rows = cursor.fetchall()
-    for row in rows:
-        rec = tuple(row)
-        item_lis.append(rec)
+        sel_qry = """
+            SELECT SUBSTRING(REPLACE(TO_CHAR(value_date, 'DD Mon'), ' ', '-'), 1, 6) AS day, category, SUM(sales_amt) tot_sales
+            FROM sales_daily_rollup_tbl
+            WHERE value_date >= %s AND category <> 'Other'
+            GROUP BY value_date, category
+        """
+        cursor.execute(sel_qry, (start_date,))
 
-    cursor.close()
-    return item_lis
+        rows = cursor.fetchall()
+        for row in rows:
+            rec = tuple(row)
+            item_lis.append(rec)
 
-def validate_item(connection, item):
-    cursor = connection.cursor()
-    sel_qry = "SELECT 1 FROM BULK_ORDER_TBL WHERE item_name = %(itm)s"
-    try:
-        cursor.execute(sel_qry, {"itm": item})
-        row = cursor.fetchone()
         cursor.close()
-        if row is None:
-            logging.warning(f"Invalid item: {item}")
-            return 0
-        logging.info(f"Validated item: {item}")
-        return 1
-    except psycopg.Error as e:
-        logging.error(f"DB Fetch Error for item {item}: {e}")
-        st.error(f"DB Fetch Error: {e}")
-        return 0
-
-def get_item_stock(connection, item,qty) :
-    chk = check_time()
-    
-    cursor = connection.cursor()
-    chk_qry = "SELECT spl_flag FROM BULK_ORDER_TBL WHERE item_name = %(item)s"
-    cursor.execute(chk_qry,{"item" : item})
-    row = cursor.fetchone()
-    chk_flg = row[0] if row else None
-    if chk_flg == 'Y' and chk == 0 :
-        avail_stock = 0
-        qty = 0
-        cursor.close()
-        return avail_stock, qty
-                   
-    stk_qry = "SELECT avail_stock FROM STOCK_MAINTENANCE_TXN_TBL WHERE item_name = %(item)s AND value_date = CURRENT_DATE"
-    cursor.execute(stk_qry, {"item" : item})
-    row = cursor.fetchone()
-    avail_stock = row[0] if row else 0
-    cursor.close()
-    
-    if avail_stock == 0 :
-        qty = 0
-        return avail_stock, qty
-    
-    elif avail_stock >= qty :
-        avail_stock -= qty
-        
-        cursor = connection.cursor()
-        upd_qry = "UPDATE STOCK_MAINTENANCE_TXN_TBL SET avail_stock = %(avail_stock)s WHERE item_name = %(item)s AND value_date = CURRENT_DATE"
-        try:
-            cursor.execute(upd_qry, {"item" : item, "avail_stock" : avail_stock})
-        except psycopg.Error as e:
-            st.error(f"DB Update Error: {e}")
-        connection.commit()
-        cursor.close()
-        return avail_stock, qty
-        
-    else :
-        qty = avail_stock
-        avail_stock = 0
-        cursor = connection.cursor()
-        try:
-            upd_qry = "UPDATE STOCK_MAINTENANCE_TXN_TBL SET avail_stock = 0 WHERE item_name = %(item)s AND value_date = CURRENT_DATE"
-            cursor.execute(upd_qry, {"item" : item})
-        except psycopg.Error as e:
-            st.error(f"DB Update Error: {e}")
-        connection.commit()
-        cursor.close() 
-        return avail_stock, qty
+        return item_lis
 
-logging.basicConfig(level=logging.INFO, filename=os.path.join(BASE_DIR, 'Bulk_Import', 'bulk_order.log'))
+# Logs go to the container's stderr (CloudWatch on ECS), not a shared file
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(threadName)s %(message)s")
 
-def insert_log(connection, file, message):
-    if not file:
-        logging.info("No file provided for logging")
-        return
-    cursor = connection.cursor()
-    sel_qry = "SELECT 1 FROM bulk_order_log_tbl WHERE to_date(value_date,'YYYY-MM-DD') = CURRENT_DATE AND log_message = %(msg)s AND file_name = %(fil)s"
-    cursor.execute(sel_qry, {"msg": message, "fil": file})
-    row = cursor.fetchone()
-    cursor.close()
-    if row is None:
-        cursor = connection.cursor()
-        ins_qry = "INSERT INTO bulk_order_log_tbl(value_date, file_name, log_message) VALUES(CURRENT_DATE, %(2)s, %(3)s)"
-        try:
-            cursor.execute(ins_qry, {"2": file, "3": message})
-            logging.info(f"Logged: {message} for file {file}")
-        except psycopg.Error as e:
-            logging.error(f"DB Insert Error: {e}")
-            return
-        connection.commit()
-        cursor.close()
+@st.cache_resource
+def apply_migrations(_pool):
+    """Bring the schema up to the latest Files/migrations version once per process."""
+    applied = migrations.apply(_pool, MIGRATIONS_DIR)
+    if applied:
+        logging.info(f"Applied schema migrations: {', '.join(applied)}")
+    return applied
 
-def load_bulk_header(connection,file,status) :
-    if len(file) == 0 :
-        return
-    cursor = connection.cursor()
-    sel_qry = "SELECT 1 FROM bulk_order_header_tbl WHERE value_date = CURRENT_DATE AND file_name = %(fil)s"
-    cursor.execute(sel_qry, {"fil" : file})
-    row = cursor.fetchone()
-    cursor.close()
-    if row is None :
-        cursor = connection.cursor()
-        ins_qry = "INSERT INTO bulk_order_header_tbl VALUES(CURRENT_DATE, %(fil)s, %(stat)s)"
-        cursor.execute(ins_qry, {"fil" : file, "stat" : status})
-        connection.commit()
-        cursor.close()
+@st.cache_resource
+def ensure_sales_rollup(_pool):
+    """Backfill the daily sales rollup once per process if it is empty."""
+    sales_engine.rebuild_rollup(_pool, only_if_empty=True)
+    return True
 
-def update_bulk_header(connection,file,status) :
-    cursor = connection.cursor()
-    upd_qry = "UPDATE bulk_order_header_tbl SET status = %(st)s WHERE value_date = CURRENT_DATE AND file_name = %(fil)s"
-    cursor.execute(upd_qry, {"fil" : file, "st" : status})
-    connection.commit()
-    cursor.close()
+BULK_WORKERS = int(os.environ.get('BULK_WORKERS', 2))
+BULK_POLL_INTERVAL = int(os.environ.get('BULK_POLL_INTERVAL', 2))
+
+@st.cache_resource
+def start_bulk_workers(_pool):
+    """Start this process's bulk-import worker threads."""
+    snapshot = get_stock_snapshot(_pool)
+
+    def on_levels(levels):
+        # Each committed chunk took stock: publish the new levels and let menus drop sold-out items
+        snapshot.publish(levels)
+        if levels:
+            invalidate_menu_cache()
+
+    return bulk_engine.BulkJobWorkers(_pool, BULK_WORKERS, bulk_engine.spl_window_open, on_levels=on_levels)
+
+def show_bulk_bill(lines):
+    """Show bill lines, totals and item breakdown of a processed bulk order; returns the priced lines."""
+    df = pd.DataFrame(lines, columns = ["Item Name","Quantity","Price","Tax"])
+    df[["Price", "Tax"]] = df[["Price", "Tax"]].apply(pd.to_numeric)
+    bill_lis = df.values.tolist()
+    tot_price = float(df["Price"].sum())
+    tot_tax = float(df["Tax"].sum())
+    st.dataframe(df)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Subtotal", f"Rs.{tot_price:.2f}")
+    col2.metric("Tax Amt", f"Rs.{tot_tax:.2f}")
+    col3.metric("Tot. Bill Amt", f"Rs.{tot_price+tot_tax:.2f}")
+    fig_pie, ax = plt.subplots()
+    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
+    sales_by_item = df.groupby('Item Name')['Quantity'].sum()
+    if len(sales_by_item) > 0 :
+        sales_by_item.plot(kind='pie', ax=ax, autopct='%1.1f%%', labels=sales_by_item.index)
+        ax.set_title('Sales Breakdown by Item')
+        st.pyplot(fig_pie)
+    return bill_lis
+
+@st.fragment(run_every=BULK_POLL_INTERVAL)
+def show_bulk_jobs(pool, file, digest):
+    """Poll the current upload's job and today's queue; the workers do the processing."""
+    job = bulk_engine.get_job(pool, digest) if digest else None
+    if job and job["queued_at"] is not None:
+        status = job["status"]
+        if status == "OPEN":
+            st.info(f"{file}: queued for processing")
+        elif status == "RUNNING":
+            total = job["total_rows"] or 0
+            done = job["progress_rows"]
+            st.progress(min(done / total, 1.0) if total else 0.0, text=f"{file}: {done} of {total or '?'} lines processed")
+        elif status == "Processed":
+            st.write("Processed Orders ###")
+            st.session_state.bulk_lis = show_bulk_bill(job["result_lines"])
+        elif status == "Failed":
+            st.error(f"{file}: processing failed - {job['message']}. Upload the file again and press Process Order to resume.")
+    jobs = bulk_engine.list_jobs(pool)
+    if not jobs.empty:
+        st.write("### Bulk Jobs Today")
+        st.dataframe(jobs)
 
 @st.dialog("Menu Alert!")
 def show_special_avail_popup():
@@ -796,8 +897,8 @@ def show_special_unavail_popup():
     st.warning("Available window 5 - 7 PM.")    
 
 
-def show_today_spl_popup_old(connection):
-    spl_df = get_today_spl(connection)
+def show_today_spl_popup_old(pool):
+    spl_df = get_today_spl(pool, business_date())
 
     if spl_df.empty:
         st.info(f"No specials available today!")
@@ -808,8 +909,8 @@ from datetime import datetime
 weekday = datetime.now().strftime("%A")
 
 @st.dialog(f"{weekday}'s Special!")
-def show_today_spl_popup(connection):
-    spl_df = get_today_spl(connection)
+def show_today_spl_popup(pool):
+    spl_df = get_today_spl(pool, business_date())
     
     if spl_df.empty:
         st.info("😔 No specials available today. Check back tomorrow!")
@@ -832,46 +933,6 @@ def show_today_spl_popup(connection):
         
         st.caption("👨‍🍳 Chef's Recommendation")
 
-def check_bulk_header(connection,file) :
-    if len(file) != 0 :
-        cursor = connection.cursor()
-        chk_qry = "SELECT 1 FROM bulk_order_header_tbl WHERE value_date = CURRENT_DATE AND file_name = %(fil)s AND status='Processed' "
-        cursor.execute(chk_qry, {"fil" : file})
-        row = cursor.fetchone()
-        cursor.close()
-        if row is None :
-            return 0
-        return 1
-
-def get_item_price(connection,item,qty) :
-    cursor = connection.cursor()
-    sel_qry = "SELECT price, tax_category FROM BULK_ORDER_TBL WHERE item_name = %(itm)s"
-    try :
-        cursor.execute(sel_qry,{"itm" :item})
-    except psycopg.Error as e:
-        st.error(f"DB Fetch Error: {e}")
-    row = cursor.fetchone()
-    price = 0
-    tax_cat = None
-    if row:
-        if int(row[0]) > 0 :
-            price = row[0] * qty
-            tax_cat = row[1]
-    cursor.close()
-
-    if tax_cat:
-        tax_qry = "SELECT tax_slab FROM TAX_MAINTENANCE_TBL WHERE category_name = %(tax_cat)s"
-        cursor = connection.cursor()
-        cursor.execute(tax_qry, {"tax_cat" : tax_cat})
-        row = cursor.fetchone()
-        tax = row[0] if row else 0
-        cursor.close()
-        tax_amt = price * tax
-    else:
-        tax_amt = 0
-
-    return price, tax_amt
-
 ##
 
 from datetime import datetime
@@ -879,22 +940,18 @@ from datetime import datetime
 
 def get_current_month_sales(connection):
     today = datetime.today().date()  
-    current_month = today.month
-    current_year = today.year
     
     query = """
-        SELECT to_char(value_date::date, 'Mon-DD') AS value_date, sum(tot_sales_amt) AS sales_amount
-        FROM sales_invoice_tbl 
-        WHERE EXTRACT(MONTH FROM value_date) = %(month)s
-          AND EXTRACT(YEAR FROM value_date) = %(year)s
+        SELECT to_char(value_date, 'Mon-DD') AS value_date, sum(sales_amt) AS sales_amount
+        FROM sales_daily_rollup_tbl 
+        WHERE value_date >= %(month_start)s
           AND value_date <= %(today)s
-       GROUP BY value_date::date 
+       GROUP BY value_date 
        ORDER BY value_date
     """
     
     df = pd.read_sql(query, connection, params={
-        'month': current_month,
-        'year': current_year,
+        'month_start': today.replace(day=1),
         'today': today
     })
     
@@ -907,21 +964,18 @@ def get_current_month_sales(connection):
 
 def get_current_week_sales(connection):
     today = datetime.today().date()  
-    current_month = today.month
-    current_year = today.year
     
     query = """
-        select substr(to_char(value_date::date,'DD-Day'),1,6) AS value_date, tot_sales_amt AS sales_amount
-        FROM sales_invoice_tbl 
-        WHERE EXTRACT(MONTH FROM value_date) = %(month)s
-          AND EXTRACT(YEAR FROM value_date) = %(year)s
-          AND value_date >= value_date -7
-        ORDER BY value_date
+        select substr(to_char(value_date,'DD-Day'),1,6) AS value_date, sum(sales_amt) AS sales_amount
+        FROM sales_daily_rollup_tbl 
+        WHERE value_date > %(today)s - 7
+          AND value_date <= %(today)s
+        GROUP BY value_date 
+        ORDER BY MIN(value_date)
     """
     
     df = pd.read_sql(query, connection, params={
-        'month': current_month,
-        'year': current_year
+        'today': today
         })
     
     # Ensure date is datetime for proper x-axis
@@ -932,22 +986,16 @@ def get_current_week_sales(connection):
 
 def get_current_day_sales(connection):
     today = datetime.today().date()  
-    current_month = today.month
-    current_year = today.year
     
     query = """
         select  item_name, sum(sales_amt) AS sales_amount
-        FROM sales_dtl_tbl 
-        WHERE EXTRACT(MONTH FROM value_date) = %(month)s
-          AND EXTRACT(YEAR FROM value_date) = %(year)s
-          AND value_date = %(today)s
+        FROM sales_daily_rollup_tbl 
+        WHERE value_date = %(today)s
         GROUP BY item_name
         ORDER BY sales_amount desc
     """
     
     df = pd.read_sql(query, connection, params={
-        'month': current_month,
-        'year': current_year,
         'today': today
         })
     
@@ -956,6 +1004,88 @@ def get_current_day_sales(connection):
     df = df.sort_values('sales_amount', ascending=False)
     
     return df
+
+
+@st.cache_resource
+def get_dashboard_executor():
+    """Worker threads shared by every session for the dashboard's side queries."""
+    return ThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, thread_name_prefix="dashboard")
+
+def _borrow_connections(pool, count):
+    """count pooled connections, or none if they are not all free within DASHBOARD_CONN_TIMEOUT."""
+    borrowed = []
+    try:
+        for _ in range(count):
+            borrowed.append(pool.getconn(timeout=DASHBOARD_CONN_TIMEOUT))
+    except PoolTimeout:
+        for connection in borrowed:
+            pool.putconn(connection)
+        return []
+    return borrowed
+
+def _query_in_snapshot(pool, connection, snapshot_id, imported, query_fn):
+    """Import the exported snapshot on a borrowed connection and run query_fn in it.
+
+    imported (a Future) gets True or False as soon as the import has been
+    tried. When it fails query_fn is not run and None is returned, so the
+    leader can run it inside the snapshot instead. The connection's
+    transaction is ended and the connection returned to the pool either way.
+    """
+    try:
+        try:
+            connection.execute(sql.SQL("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY; SET TRANSACTION SNAPSHOT {}")
+                               .format(sql.Literal(snapshot_id)), prepare=False)
+        except psycopg.Error as e:
+            logging.warning(f"Dashboard snapshot import failed, running {query_fn.__name__} on the leader: {e}")
+            imported.set_result(False)
+            return None
+        imported.set_result(True)
+        return query_fn(connection)
+    finally:
+        if not imported.done():
+            imported.set_result(False)
+        connection.rollback()
+        pool.putconn(connection)
+
+def load_dashboard_data(pool):
+    """Load month, week and day sales concurrently from one consistent snapshot.
+
+    The leader connection opens a REPEATABLE READ transaction and exports its
+    snapshot; two more pooled connections, taken before the export, each
+    import it on an executor thread and run the week or day query while the
+    leader runs the month query. The leader's transaction stays open until
+    both imports have been tried; a query whose import failed runs on the
+    leader, so every result comes from the same snapshot. The leader is
+    then returned to the pool without waiting for the helper queries. When
+    the pool cannot spare the extra connections within DASHBOARD_CONN_TIMEOUT
+    all three queries run in turn on the leader.
+    """
+    with pool.connection() as connection:
+        connection.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        helpers = _borrow_connections(pool, 2)
+        if not helpers:
+            logging.warning("Dashboard: connection pool busy, loading sales sequentially")
+            return (get_current_month_sales(connection), get_current_week_sales(connection),
+                    get_current_day_sales(connection))
+        pending = []
+        try:
+            snapshot_id = connection.execute("SELECT pg_export_snapshot()").fetchone()[0]
+            executor = get_dashboard_executor()
+            for query_fn in (get_current_week_sales, get_current_day_sales):
+                imported = Future()
+                future = executor.submit(_query_in_snapshot, pool, helpers[0], snapshot_id, imported, query_fn)
+                helpers.pop(0)
+                pending.append((query_fn, imported, future))
+        finally:
+            # Connections not yet handed to a worker go straight back to the pool.
+            for helper in helpers:
+                helper.rollback()
+                pool.putconn(helper)
+        month_df = get_current_month_sales(connection)
+        on_leader = {query_fn: query_fn(connection) for query_fn, imported, _ in pending if not imported.result()}
+    week_df, day_df = (on_leader[query_fn] if query_fn in on_leader else future.result()
+                       for query_fn, _, future in pending)
+    return month_df, week_df, day_df
     
 ##
 from sendgrid import SendGridAPIClient
@@ -1085,18 +1215,19 @@ def realign_list(item_list):
     return xdict
 
     
-def send_stock_alert(connection, item_name, new_stock):
+def send_stock_alert(pool, item_name, new_stock):
     """Send email alert if stock is low/zero."""
     if new_stock > 0:  # Customize threshold here (e.g., > 5)
         return  # No alert needed
     
     # Check for recent alert (simple DB flag to avoid spam; add column if needed)
-    cursor = connection.cursor()
-    cursor.execute("SELECT 1 FROM stock_alerts WHERE item_name = %s AND alert_date = CURRENT_DATE", (item_name,))
-    if cursor.fetchone():
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1 FROM stock_alerts WHERE item_name = %s AND alert_date = CURRENT_DATE", (item_name,))
+        if cursor.fetchone():
+            cursor.close()
+            return  # Already alerted today
         cursor.close()
-        return  # Already alerted today
-    cursor.close()
     
     # Email setup
     msg = MIMEMultipart('alternative')
@@ -1127,12 +1258,13 @@ def send_stock_alert(connection, item_name, new_stock):
             st.success(f"Alert sent for {item_name}!")
         else:
             st.info(f"Demo: Would send alert for {item_name} (stock: {new_stock})")
-        
-        # Log to DB (create table if needed: CREATE TABLE stock_alerts (item_name VARCHAR, alert_date DATE);)
-        cursor = connection.cursor()
-        cursor.execute("INSERT INTO stock_alerts (item_name, alert_date) VALUES (%s, CURRENT_DATE)", (item_name,))
-        connection.commit()
-        cursor.close()
+    
+        # Log to DB (stock_alerts comes from Files/migrations/001_base_tables.txt)
+        with pool.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute("INSERT INTO stock_alerts (item_name, alert_date) VALUES (%s, CURRENT_DATE)", (item_name,))
+            connection.commit()
+            cursor.close()
     except Exception as e:
         st.error(f"Email alert failed: {e}")
         logging.error(f"Stock alert error for {item_name}: {e}")
@@ -1173,37 +1305,51 @@ def send_sms_alert(item_name, new_stock):
 
 if 'initialized' not in st.session_state:
     st.session_state.order_menu = {}
-    st.session_state.stock_rec = {}
     st.session_state.tax_data = {}
     st.session_state.tax_lis = {}
     st.session_state.bulk_lis = []
     st.session_state.count_lis = []
     st.session_state.menu_alert = set()
+    st.session_state.cart_session_id = uuid.uuid4().hex
     st.session_state.initialized = True
 
 if 'order_menu' not in st.session_state:
     st.session_state.order_menu = {}
-    st.session_state.stock_rec = {}
     st.session_state.tax_data = {}
     st.session_state.count_lis = []
     st.session_state.menu_alert = set()
     st.session_state.tax_lis = {}  # For item-specific tax categories
 
+if 'cart_session_id' not in st.session_state:
+    st.session_state.cart_session_id = uuid.uuid4().hex
+
 # --- Main App ---
 st.set_page_config(page_title="Restaurant Dashboard", layout="wide", initial_sidebar_state="expanded")
 st.title("🍽️ Interactive Restaurant Management Dashboard")
 
 
-connection = get_connection()
-if not connection:
+pool = get_connection_pool()
+if not pool:
     st.stop()
 
-# Insert stock txn data
-load_stock_txn_data(connection)
+# Tables, columns and indexes (once per process)
+apply_migrations(pool)
+# Insert stock txn data (once per day per process)
+run_daily_stock_rollover(pool, db_date())
+# Apply today's weekday specials (once per day per process)
+activate_daily_specials(pool, business_date())
+# Stock movement ledger and its background compaction
+start_stock_ledger(pool)
+# Background expiry of abandoned cart holds
+start_reservation_sweeper(pool)
+# Daily sales rollup behind the dashboard and reports
+ensure_sales_rollup(pool)
+# Bulk-import worker threads
+bulk_workers = start_bulk_workers(pool)
 # Load tax and stock on startup
 try:
-    st.session_state.tax_data = load_tax_data(connection)
-    st.session_state.stock_rec = get_stock_data(connection)
+    st.session_state.tax_data = get_reference_data(pool).get("tax_slabs")
+    get_stock_snapshot(pool).get()
     st.success("Data loaded! Select a portal in the sidebar.")
 except Exception as e:
     st.error(f"Error loading tax/stock data: {e}")
@@ -1219,6 +1365,8 @@ st.markdown("""
 # Sidebar for Portal Selection
 portal = st.sidebar.selectbox("Select Portal", ["Dashboard (Main)","Public (Order)","Corporate (Admin)"])
 if st.sidebar.button("Logout"):
+    if st.session_state.order_menu:
+        get_stock_snapshot(pool).publish(release_cart_stock(pool, st.session_state.cart_session_id))
     st.session_state.clear()
     st.header("Logging out!")
     st.stop()
@@ -1228,7 +1376,8 @@ if portal == "Dashboard (Main)":
     st.header("📊 Restaurant Dashboard: Sales Trend")
     
 
-    sales_df = get_current_month_sales(connection)
+    month_sales_df, week_sales_df, day_sales_df = load_dashboard_data(pool)
+    sales_df = month_sales_df
     if sales_df.empty:
         st.info("No sales data yet for this month.")
     else:
@@ -1248,7 +1397,7 @@ if portal == "Dashboard (Main)":
             
             st.markdown("##### Current Week Sales")
 
-            sales_df = get_current_week_sales(connection)
+            sales_df = week_sales_df
             
             if sales_df.empty:
                 st.info("No sales data yet for this month.")
@@ -1263,7 +1412,7 @@ if portal == "Dashboard (Main)":
         
         st.write("\n" * 10)
         st.markdown("### Today's Sales data")
-        sales_df = get_current_day_sales(connection)
+        sales_df = day_sales_df
             
         if sales_df.empty:
             st.info("No sales data yet for this month.")
@@ -1278,19 +1427,28 @@ elif portal == "Public (Order)":
 
                 
     st.header("🛒 Public Portal: Place Orders")
+    if st.session_state.order_menu:
+        held = touch_reservations(pool, st.session_state.cart_session_id)
+        in_cart = {}
+        for item, qty, price in st.session_state.order_menu.values():
+            in_cart[item] = in_cart.get(item, 0) + int(qty)
+        if any(held.get(item, 0) < qty for item, qty in in_cart.items()):
+            get_stock_snapshot(pool).publish(release_cart_stock(pool, st.session_state.cart_session_id))
+            st.session_state.order_menu = {}
+            st.session_state.tax_lis = {}
+            invalidate_menu_cache()
+            st.warning(f"Your cart expired after {RESERVATION_TTL // 60} minutes of inactivity and was cleared.")
     tab1, tab2, tab3, tab4, tab_cart, tab_bill = st.tabs(["Coffee", "Tea", "Chat", "Special", "Cart", "Bill"])
     
     with tab1:  # Coffee
         st.subheader("☕ Coffee Menu")
         if len(st.session_state.menu_alert) == 0:
-            show_today_spl_popup(connection)
+            show_today_spl_popup(pool)
             st.session_state.menu_alert.add(1)
 
-        category = 'Coffee'
-        update_spl_item(connection, category)
         
             
-        df_coffee = fetch_coffee_df(connection)
+        df_coffee = get_menu_df(pool, "Coffee")
 
         if not df_coffee.empty:
             st.dataframe(df_coffee[['ItemNo', 'Name', 'Price']])
@@ -1298,7 +1456,7 @@ elif portal == "Public (Order)":
             item_options = df_coffee.set_index('ItemNo')['Name'].to_dict()
             selected_item_no = st.selectbox("Choose Item", options=list(item_options.keys()), format_func=lambda x: f"{x}: {item_options[x]}")
             item_name = item_options[selected_item_no]
-            max_stock = st.session_state.stock_rec.get(item_name, 0)
+            max_stock = get_stock_snapshot(pool).level(item_name)
             quantity = st.number_input(f"Quantity (Max: {max_stock})", min_value=0, max_value=max_stock, value=0,key="coffee_qty")
             
             col1, col2 = st.columns(2)
@@ -1307,18 +1465,23 @@ elif portal == "Public (Order)":
 
                 if submitted:
                     if quantity > 0:
-                        price = df_coffee[df_coffee['ItemNo'] == selected_item_no]['Price'].values[0]
-                        tax_cat = df_coffee[df_coffee['ItemNo'] == selected_item_no]['TaxCategory'].values[0]
-                        idx = len(st.session_state.order_menu)
-                        st.session_state.order_menu[idx] = [item_name, quantity, price]
-                        st.session_state.tax_lis[item_name] = tax_cat
-                        st.session_state.stock_rec[item_name] -= quantity
-                        update_stock_rec(connection, st.session_state.stock_rec)
-                        st.success(f"Added {quantity} x {item_name}!")
-                        if st.session_state.stock_rec[item_name] <= 0:
-                            send_stock_alert(connection, item_name, st.session_state.stock_rec[item_name])
-                            #send_sms_alert(item_name, st.session_state.stock_rec[item_name])
-                        st.rerun()
+                        reserved = reserve_item_stock(pool, st.session_state.cart_session_id, item_name, quantity)
+                        if reserved is None:
+                            st.error(f"Sorry, not enough {item_name} left in stock.")
+                        else:
+                            price = df_coffee[df_coffee['ItemNo'] == selected_item_no]['Price'].values[0]
+                            tax_cat = df_coffee[df_coffee['ItemNo'] == selected_item_no]['TaxCategory'].values[0]
+                            idx = len(st.session_state.order_menu)
+                            st.session_state.order_menu[idx] = [item_name, quantity, price]
+                            st.session_state.tax_lis[item_name] = tax_cat
+                            get_stock_snapshot(pool).publish({item_name: reserved})
+                            new_stock = reserved[0]
+                            st.success(f"Added {quantity} x {item_name}!")
+                            if new_stock <= 0:
+                                invalidate_menu_cache()
+                                send_stock_alert(pool, item_name, new_stock)
+                                #send_sms_alert(item_name, new_stock)
+                            st.rerun()
                     else:
                         st.error("Please select a quantity greater than 0.")
 
@@ -1328,31 +1491,34 @@ elif portal == "Public (Order)":
     with tab2:  # Tea
         st.subheader("🫖 Tea Menu")
 
-        category = 'Tea'
-        update_spl_item(connection, category)
-        df_tea = fetch_tea_df(connection)
+        df_tea = get_menu_df(pool, "Tea")
         if not df_tea.empty:
             st.dataframe(df_tea[['ItemNo', 'Name', 'Price']])
             
             item_options = df_tea.set_index('ItemNo')['Name'].to_dict()
             selected_item_no = st.selectbox("Choose Item", options=list(item_options.keys()), format_func=lambda x: f"{x}: {item_options[x]}")
             item_name = item_options[selected_item_no]
-            max_stock = st.session_state.stock_rec.get(item_name, 0)
+            max_stock = get_stock_snapshot(pool).level(item_name)
             quantity = st.number_input(f"Quantity (Max: {max_stock})", min_value=0, max_value=max_stock, value=0,key="tea_qty")
             submitted = st.button("Add Tea Order")
             if submitted and quantity > 0:
-                price = df_tea[df_tea['ItemNo'] == selected_item_no]['Price'].values[0]
-                tax_cat = df_tea[df_tea['ItemNo'] == selected_item_no]['TaxCategory'].values[0]
-                idx = len(st.session_state.order_menu)
-                st.session_state.order_menu[idx] = [item_name, quantity, price]
-                st.session_state.tax_lis[item_name] = tax_cat
-                st.session_state.stock_rec[item_name] -= quantity
-                update_stock_rec(connection, st.session_state.stock_rec)
-                st.success(f"Added {quantity} x {item_name}!")
-                if st.session_state.stock_rec[item_name] <= 0:
-                    send_stock_alert(connection, item_name, st.session_state.stock_rec[item_name])
-                    #send_sms_alert(item_name, st.session_state.stock_rec[item_name])
-                st.rerun()
+                reserved = reserve_item_stock(pool, st.session_state.cart_session_id, item_name, quantity)
+                if reserved is None:
+                    st.error(f"Sorry, not enough {item_name} left in stock.")
+                else:
+                    price = df_tea[df_tea['ItemNo'] == selected_item_no]['Price'].values[0]
+                    tax_cat = df_tea[df_tea['ItemNo'] == selected_item_no]['TaxCategory'].values[0]
+                    idx = len(st.session_state.order_menu)
+                    st.session_state.order_menu[idx] = [item_name, quantity, price]
+                    st.session_state.tax_lis[item_name] = tax_cat
+                    get_stock_snapshot(pool).publish({item_name: reserved})
+                    new_stock = reserved[0]
+                    st.success(f"Added {quantity} x {item_name}!")
+                    if new_stock <= 0:
+                        invalidate_menu_cache()
+                        send_stock_alert(pool, item_name, new_stock)
+                        #send_sms_alert(item_name, new_stock)
+                    st.rerun()
         else:
             st.warning("No tea items available.")
 
@@ -1360,60 +1526,68 @@ elif portal == "Public (Order)":
         st.subheader("🍗🥕 Chat Menu")
         category = st.selectbox("Category", ["Both", "VEG", "NV"])
         
-        cty = 'Chat'
-        update_spl_item(connection, cty)
-        df_chat = fetch_chat_df(connection, category)
+        df_chat = get_menu_df(pool, "Chat", category)
         if not df_chat.empty:
             st.dataframe(df_chat[['ItemNo', 'Name', 'Price']])
             
             item_options = df_chat.set_index('ItemNo')['Name'].to_dict()
             selected_item_no = st.selectbox("Choose Item", options=list(item_options.keys()), format_func=lambda x: f"{x}: {item_options[x]}")
             item_name = item_options[selected_item_no]
-            max_stock = st.session_state.stock_rec.get(item_name, 0)
+            max_stock = get_stock_snapshot(pool).level(item_name)
             quantity = st.number_input(f"Quantity (Max: {max_stock})", min_value=0, max_value=max_stock, value=0,key="chat_qty")
             submitted = st.button("Add Chat Order")
             if submitted and quantity > 0:
-                price = df_chat[df_chat['ItemNo'] == selected_item_no]['Price'].values[0]
-                tax_cat = df_chat[df_chat['ItemNo'] == selected_item_no]['TaxCategory'].values[0]
-                idx = len(st.session_state.order_menu)
-                st.session_state.order_menu[idx] = [item_name, quantity, price]
-                st.session_state.tax_lis[item_name] = tax_cat
-                st.session_state.stock_rec[item_name] -= quantity
-                update_stock_rec(connection, st.session_state.stock_rec)
-                st.success(f"Added {quantity} x {item_name}!")
-                if st.session_state.stock_rec[item_name] <= 0:
-                    send_stock_alert(connection, item_name, st.session_state.stock_rec[item_name])
-                    #send_sms_alert(item_name, st.session_state.stock_rec[item_name])
-                st.rerun()
+                reserved = reserve_item_stock(pool, st.session_state.cart_session_id, item_name, quantity)
+                if reserved is None:
+                    st.error(f"Sorry, not enough {item_name} left in stock.")
+                else:
+                    price = df_chat[df_chat['ItemNo'] == selected_item_no]['Price'].values[0]
+                    tax_cat = df_chat[df_chat['ItemNo'] == selected_item_no]['TaxCategory'].values[0]
+                    idx = len(st.session_state.order_menu)
+                    st.session_state.order_menu[idx] = [item_name, quantity, price]
+                    st.session_state.tax_lis[item_name] = tax_cat
+                    get_stock_snapshot(pool).publish({item_name: reserved})
+                    new_stock = reserved[0]
+                    st.success(f"Added {quantity} x {item_name}!")
+                    if new_stock <= 0:
+                        invalidate_menu_cache()
+                        send_stock_alert(pool, item_name, new_stock)
+                        #send_sms_alert(item_name, new_stock)
+                    st.rerun()
         else:
             st.warning(f"No chat items available for {category}.")
 
     with tab4:  # Special
         st.subheader("🥂 Special Menu")
         
-        df_spl = fetch_spl_df(connection)
+        df_spl = fetch_spl_df(pool)
         if not df_spl.empty:
             st.dataframe(df_spl[['ItemNo', 'Name', 'Price']])
             
             item_options = df_spl.set_index('ItemNo')['Name'].to_dict()
             selected_item_no = st.selectbox("Choose Item", options=list(item_options.keys()), format_func=lambda x: f"{x}: {item_options[x]}")
             item_name = item_options[selected_item_no]
-            max_stock = st.session_state.stock_rec.get(item_name, 0)
+            max_stock = get_stock_snapshot(pool).level(item_name)
             quantity = st.number_input(f"Quantity (Max: {max_stock})", min_value=0, max_value=max_stock, value=0,key="snack_qty")
             submitted = st.button("Add Snack Order")
             if submitted and quantity > 0:
-                price = df_spl[df_spl['ItemNo'] == selected_item_no]['Price'].values[0]
-                tax_cat = df_spl[df_spl['ItemNo'] == selected_item_no]['TaxCategory'].values[0]
-                idx = len(st.session_state.order_menu)
-                st.session_state.order_menu[idx] = [item_name, quantity, price]
-                st.session_state.tax_lis[item_name] = tax_cat
-                st.session_state.stock_rec[item_name] -= quantity
-                update_stock_rec(connection, st.session_state.stock_rec)
-                st.success(f"Added {quantity} x {item_name}!")
-                if st.session_state.stock_rec[item_name] <= 0:
-                    send_stock_alert(connection, item_name, st.session_state.stock_rec[item_name])
-                    #send_sms_alert(item_name, st.session_state.stock_rec[item_name])
-                st.rerun()
+                reserved = reserve_item_stock(pool, st.session_state.cart_session_id, item_name, quantity)
+                if reserved is None:
+                    st.error(f"Sorry, not enough {item_name} left in stock.")
+                else:
+                    price = df_spl[df_spl['ItemNo'] == selected_item_no]['Price'].values[0]
+                    tax_cat = df_spl[df_spl['ItemNo'] == selected_item_no]['TaxCategory'].values[0]
+                    idx = len(st.session_state.order_menu)
+                    st.session_state.order_menu[idx] = [item_name, quantity, price]
+                    st.session_state.tax_lis[item_name] = tax_cat
+                    get_stock_snapshot(pool).publish({item_name: reserved})
+                    new_stock = reserved[0]
+                    st.success(f"Added {quantity} x {item_name}!")
+                    if new_stock <= 0:
+                        invalidate_menu_cache()
+                        send_stock_alert(pool, item_name, new_stock)
+                        #send_sms_alert(item_name, new_stock)
+                    st.rerun()
         else:
             st.warning("Special menu unavailable (only 5-7 PM).")
 
@@ -1436,20 +1610,22 @@ elif portal == "Public (Order)":
                 #if cancel_qty != 0:
                     #cancel_qty = order_df.loc[cancel_idx, 'Qty']
                     
-                st.session_state.stock_rec[item_name] += cancel_qty
+                released = release_reservation(pool, st.session_state.cart_session_id, item_name, cancel_qty)
+                if released is not None:
+                    get_stock_snapshot(pool).publish({item_name: released})
                 if cancel_qty == order_df.loc[cancel_idx, 'Qty']:
                     del st.session_state.order_menu[cancel_idx]
                 else:
                     st.session_state.order_menu[cancel_idx][1] -= cancel_qty
-                update_stock_rec(connection, st.session_state.stock_rec)
+                invalidate_menu_cache()
                 st.success(f"Cancelled {cancel_qty} x {item_name}!")
                 st.rerun()
             if st.button("Clear Cart"):
-                for idx, row in order_df.iterrows():
-                    st.session_state.stock_rec[row['Item']] += row['Qty']
-                update_stock_rec(connection, st.session_state.stock_rec)
+                levels = release_cart_stock(pool, st.session_state.cart_session_id)
+                get_stock_snapshot(pool).publish(levels)
                 st.session_state.order_menu = {}
                 st.session_state.tax_lis = {}
+                invalidate_menu_cache()
                 st.success("Cart cleared!")
                 st.rerun()
         else:
@@ -1504,7 +1680,7 @@ elif portal == "Public (Order)":
             #st.pyplot(fig_pie)
             if st.button("Confirm & Insert Sales to DB"):
                 tmp_lis = order_df[['Item', 'Qty', 'Total']].values.tolist()
-                insert_db_data(connection, tmp_lis)
+                insert_db_data(pool, tmp_lis, st.session_state.cart_session_id)
                 st.session_state.order_menu = {}
                 st.session_state.tax_lis = {}
                 st.success("Sales inserted! Cart cleared.")
@@ -1550,18 +1726,39 @@ elif portal == "Corporate (Admin)":
         with tab_stock:
             st.subheader("📈 View Current Stock")
             if st.button("Refresh & Show Stock"):
-                st.session_state.stock_rec = get_stock_data(connection)
-                df_stock = pd.DataFrame(list(st.session_state.stock_rec.items()), columns=['Item', 'Available Stock'])
+                get_stock_snapshot(pool).invalidate()
+                stock_rec = get_stock_snapshot(pool).get()
+                df_stock = pd.DataFrame(list(stock_rec.items()), columns=['Item', 'Available Stock'])
                 st.dataframe(df_stock)
 
             st.subheader("📊 Load Shortage Stocks")
             if st.button("Get Shortage Stock"):
-                st.session_state.stock_rec = get_shortage_stock_data(connection)
-                df_stock = pd.DataFrame(list(st.session_state.stock_rec.items()), columns=['Item', 'Available Stock'])
+                stock_rec = get_shortage_stock_data(pool)
+                df_stock = pd.DataFrame(list(stock_rec.items()), columns=['Item', 'Available Stock'])
                 st.dataframe(df_stock)
             
             if st.button("Load Stock"):
-                load_shortage_stock_data(connection)
+                load_shortage_stock_data(pool)
+                get_stock_snapshot(pool).invalidate()
+                invalidate_menu_cache()
+
+            st.subheader("🧾 Stock Movements")
+            if st.button("Show Stock Movements"):
+                df_moves = pd.DataFrame(stock_ledger.get_movements(pool), columns=['Id', 'Time', 'Item', 'Type', 'Qty', 'Reference'])
+                st.dataframe(df_moves)
+
+            st.subheader("📐 Prepared Statement Stats")
+            mode = "server-side" if use_server_prepare() else "client-side (pooler)"
+            st.caption(f"Prepare mode: {mode} (DB_PREPARE_MODE={DB_PREPARE_MODE}, DB_PORT={os.environ.get('DB_PORT', '6543')})")
+            if not use_server_prepare():
+                st.caption("Nothing is prepared in this mode, so the counts are plain executions. "
+                           "Set DB_PREPARE_MODE=server or use a session-mode port to reuse plans.")
+            if st.button("Show Statement Stats"):
+                st.dataframe(get_statement_stats().as_dataframe())
+
+            st.subheader("🗃️ Reference Data Cache")
+            if st.button("Show Cache Stats"):
+                st.dataframe(get_reference_data(pool).as_dataframe())
         with tab_add_del:
             st.subheader("➕/➖ Item Addition/Deletion")
             category = st.selectbox("Category", ["Coffee", "Tea", "Chat", "Spl"])
@@ -1571,14 +1768,14 @@ elif portal == "Corporate (Admin)":
                     item_name = st.text_input("Item Name")
                 else : 
                     if category == 'Coffee':
-                        df_items = fetch_coffee_df(connection)
+                        df_items = fetch_coffee_df(pool)
                     elif category == 'Tea':
-                        df_items = fetch_tea_df(connection)
+                        df_items = fetch_tea_df(pool)
                     elif category == 'Chat':
                         category = 'Both'
-                        df_items = fetch_chat_df(connection, category)
+                        df_items = fetch_chat_df(pool, category)
                     elif category == 'Spl':
-                        df_items = fetch_snack_df(connection)
+                        df_items = fetch_snack_df(pool)
                     item_options = df_items.set_index('ItemNo')['Name'].to_dict()
                     item_no = st.selectbox("Select Item", options=list(item_options.keys()), format_func=lambda x: f"{x}: {item_options[x]}")
                     item_name = item_options[item_no]
@@ -1595,35 +1792,37 @@ elif portal == "Corporate (Admin)":
                     
                 submitted = st.form_submit_button(f"{action} Item")
                 if submitted:
-                    cursor = connection.cursor()
-                    if action == "Add":
-                        if category == "Coffee":
-                            ins_stmt = "INSERT INTO coffee_menu_tbl(coffee_name, price, tax_category) VALUES (%s, %s, %s)"
-                            cursor.execute(ins_stmt, (item_name, price, tax_slab))
-                        elif category == "Tea":
-                            ins_stmt = "INSERT INTO tea_menu_tbl(tea_name, price, tax_category) VALUES (%s, %s, %s)"
-                            cursor.execute(ins_stmt, (item_name, price, tax_slab))
-                        elif category == "Chat":
-                            ins_stmt = "INSERT INTO chat_menu_tbl(chat_name, price, tax_category, category) VALUES (%s, %s, %s, %s)"
-                            cursor.execute(ins_stmt, (item_name, price, tax_slab, item_category))
-                        else:
-                            ins_stmt = "INSERT INTO special_snacks_tbl(item_name, price, tax_category) VALUES (%s, %s, %s)"
-                            cursor.execute(ins_stmt, (item_name, price, tax_slab))
-                    else:  # Delete
-                        if category == "Coffee":
-                            del_stmt = "UPDATE coffee_menu_tbl SET delete_flag='Y' WHERE coffee_name = %s"
-                            cursor.execute(del_stmt, (item_name,))
-                        elif category == "Tea":
-                            del_stmt = "UPDATE tea_menu_tbl SET delete_flag='Y' WHERE tea_name = %s"
-                            cursor.execute(del_stmt, (item_name,))
-                        elif category == "Chat":
-                            del_stmt = "UPDATE chat_menu_tbl SET delete_flag='Y' WHERE chat_name = %s"
-                            cursor.execute(del_stmt, (item_name,))
-                        else:
-                            del_stmt = "UPDATE special_snacks_tbl SET delete_flag='Y' WHERE item_name = %s"
-                            cursor.execute(del_stmt, (item_name,))
-                    connection.commit()
-                    cursor.close()
+                    with pool.connection() as connection:
+                        cursor = connection.cursor()
+                        if action == "Add":
+                            if category == "Coffee":
+                                ins_stmt = "INSERT INTO coffee_menu_tbl(coffee_name, price, tax_category) VALUES (%s, %s, %s)"
+                                cursor.execute(ins_stmt, (item_name, price, tax_slab))
+                            elif category == "Tea":
+                                ins_stmt = "INSERT INTO tea_menu_tbl(tea_name, price, tax_category) VALUES (%s, %s, %s)"
+                                cursor.execute(ins_stmt, (item_name, price, tax_slab))
+                            elif category == "Chat":
+                                ins_stmt = "INSERT INTO chat_menu_tbl(chat_name, price, tax_category, category) VALUES (%s, %s, %s, %s)"
+                                cursor.execute(ins_stmt, (item_name, price, tax_slab, item_category))
+                            else:
+                                ins_stmt = "INSERT INTO special_snacks_tbl(item_name, price, tax_category) VALUES (%s, %s, %s)"
+                                cursor.execute(ins_stmt, (item_name, price, tax_slab))
+                        else:  # Delete
+                            if category == "Coffee":
+                                del_stmt = "UPDATE coffee_menu_tbl SET delete_flag='Y' WHERE coffee_name = %s"
+                                cursor.execute(del_stmt, (item_name,))
+                            elif category == "Tea":
+                                del_stmt = "UPDATE tea_menu_tbl SET delete_flag='Y' WHERE tea_name = %s"
+                                cursor.execute(del_stmt, (item_name,))
+                            elif category == "Chat":
+                                del_stmt = "UPDATE chat_menu_tbl SET delete_flag='Y' WHERE chat_name = %s"
+                                cursor.execute(del_stmt, (item_name,))
+                            else:
+                                del_stmt = "UPDATE special_snacks_tbl SET delete_flag='Y' WHERE item_name = %s"
+                                cursor.execute(del_stmt, (item_name,))
+                        connection.commit()
+                        cursor.close()
+                    invalidate_menu_cache()
                     st.success(f"{action}ed {item_name} in {category}!")
                     st.rerun()
         with tab_update_price:
@@ -1631,13 +1830,13 @@ elif portal == "Corporate (Admin)":
             category_price = st.selectbox("Category for Price Update", ["Coffee", "Tea", "Chat", "Spl"], key="price_cat")
             with st.form("price_update"):
                 if category_price == "Coffee":
-                    df_items = fetch_coffee_df(connection)
+                    df_items = fetch_coffee_df(pool)
                 elif category_price == "Tea":
-                    df_items = fetch_tea_df(connection)
+                    df_items = fetch_tea_df(pool)
                 elif category_price == "Chat":
-                    df_items = fetch_chat_df(connection, "Both")
+                    df_items = fetch_chat_df(pool, "Both")
                 else:
-                    df_items = fetch_snack_df(connection)
+                    df_items = fetch_snack_df(pool)
                 
                 if not df_items.empty:
                     item_options = df_items.set_index('ItemNo')['Name'].to_dict()
@@ -1654,22 +1853,24 @@ elif portal == "Corporate (Admin)":
                 
     
                     if submitted:
-                        cursor = connection.cursor()
-                        item_name = item_options[item_no]
-                        if category_price == "Coffee":
-                            upd_stmt = "UPDATE coffee_menu_tbl SET price = %s WHERE coffee_name = %s"
-                            cursor.execute(upd_stmt, (new_price, item_name))
-                        elif category_price == "Tea":
-                            upd_stmt = "UPDATE tea_menu_tbl SET price = %s WHERE tea_name = %s"
-                            cursor.execute(upd_stmt, (new_price, item_name))
-                        elif category_price == "Chat":
-                            upd_stmt = "UPDATE chat_menu_tbl SET price = %s WHERE chat_name = %s"
-                            cursor.execute(upd_stmt, (new_price, item_name))
-                        else:
-                            upd_stmt = "UPDATE special_snacks_tbl SET price = %s WHERE item_name = %s"
-                            cursor.execute(upd_stmt, (new_price, item_name))
-                        connection.commit()
-                        cursor.close()
+                        with pool.connection() as connection:
+                            cursor = connection.cursor()
+                            item_name = item_options[item_no]
+                            if category_price == "Coffee":
+                                upd_stmt = "UPDATE coffee_menu_tbl SET price = %s WHERE coffee_name = %s"
+                                cursor.execute(upd_stmt, (new_price, item_name))
+                            elif category_price == "Tea":
+                                upd_stmt = "UPDATE tea_menu_tbl SET price = %s WHERE tea_name = %s"
+                                cursor.execute(upd_stmt, (new_price, item_name))
+                            elif category_price == "Chat":
+                                upd_stmt = "UPDATE chat_menu_tbl SET price = %s WHERE chat_name = %s"
+                                cursor.execute(upd_stmt, (new_price, item_name))
+                            else:
+                                upd_stmt = "UPDATE special_snacks_tbl SET price = %s WHERE item_name = %s"
+                                cursor.execute(upd_stmt, (new_price, item_name))
+                            connection.commit()
+                            cursor.close()
+                        invalidate_menu_cache()
                         st.success(f"Updated price for {item_name} to Rs.{new_price:.2f}!")
                         st.rerun()
                 else:
@@ -1678,17 +1879,17 @@ elif portal == "Corporate (Admin)":
         with tab_tax_data:        
             st.subheader("🧾 Show Tax Category")
             if st.button("Get Tax Slabs"):
-                st.session_state.tax_rec = load_tax_data(connection)
+                st.session_state.tax_rec = get_reference_data(pool).get("tax_slabs")
                 df_tax = pd.DataFrame(list(st.session_state.tax_rec.items()), columns=['Tax Slab', 'Tax Amt'])
                 st.dataframe(df_tax)
             
             st.subheader("🔢 Update Tax Amount")
-            st.session_state.tax_rec = load_tax_data(connection)
+            st.session_state.tax_rec = get_reference_data(pool).get("tax_slabs")
             df_tax = pd.DataFrame(list(st.session_state.tax_rec.items()), columns=['Tax Slab', 'Tax Amt'])
             tax_category = st.selectbox("Select Tax Category", options=df_tax['Tax Slab'].unique())
             tax_amount = st.text_input("Tax Amount", value=0.0)
             if st.button("Update Tax Amount"):
-                update_tax_amt(connection,tax_category,tax_amount)
+                update_tax_amt(pool,tax_category,tax_amount)
                 st.success("Tax Amount updated successfully!")
                 st.rerun()
                 
@@ -1698,7 +1899,7 @@ elif portal == "Corporate (Admin)":
                 st.subheader("📖 Show Weekday Spl Menu")
                 ctg = st.selectbox("Menu_Category", ["Coffee", "Tea", "Chat"])
                 if st.button("Get Spl Menu"):
-                    df_weekday_spl = fetch_weekday_spl_df(connection, ctg)
+                    df_weekday_spl = fetch_weekday_spl_df(pool, ctg)
                     if not df_weekday_spl.empty:
                         st.dataframe(df_weekday_spl)
                     else:
@@ -1712,13 +1913,13 @@ elif portal == "Corporate (Admin)":
                     delflag = ['Y','N']
                     category = st.selectbox("Add_Category", ["Coffee", "Tea", "Chat"])
                     if category == 'Coffee':
-                        item_list = fetch_coffee(connection)
+                        item_list = fetch_coffee(pool)
                     elif category == 'Tea':
-                        item_list = fetch_tea(connection)
+                        item_list = fetch_tea(pool)
                     else:
-                        item_list = fetch_chat(connection)
+                        item_list = fetch_chat(pool)
 
-                    day_list = fetch_weekday(connection)
+                    day_list = get_reference_data(pool).get("weekdays")
                     
                     col1, col2, col3  = st.columns(3)
                     
@@ -1731,18 +1932,19 @@ elif portal == "Corporate (Admin)":
 
                     submitted = st.button("Add Menu", key="add-key")
                     if submitted:
-                        load_weekday_data(connection,item_selected,category,day_selected,del_flg)
+                        load_weekday_data(pool,item_selected,category,day_selected,del_flg)
+                        refresh_daily_specials()
                         st.success("Spl Menu Created")
 
                 with tab_del:
                     dflag = ['Y']
                     cat = st.selectbox("Del_Category", ["Coffee", "Tea", "Chat"])
                     if cat == 'Coffee':
-                        item_list = fetch_weekday_item(connection, cat)
+                        item_list = fetch_weekday_item(pool, cat)
                     elif cat == 'Tea':
-                        item_list = fetch_weekday_item(connection, cat)
+                        item_list = fetch_weekday_item(pool, cat)
                     else:
-                        item_list = fetch_weekday_item(connection, cat)
+                        item_list = fetch_weekday_item(pool, cat)
                         
                     item_dict = realign_list(item_list)
                     
@@ -1758,7 +1960,8 @@ elif portal == "Corporate (Admin)":
                     
                     submitted = st.button("Del Menu",key="del-key")
                     if submitted:
-                        upd_weekday_data(connection,item_selected,wkday,del_flg)
+                        upd_weekday_data(pool,item_selected,wkday,del_flg)
+                        refresh_daily_specials()
                         st.success("Spl Menu Removed")
 
 
@@ -1766,14 +1969,14 @@ elif portal == "Corporate (Admin)":
                     dflag = ['Y','N']
                     cat = st.selectbox("Update_Category", ["Coffee", "Tea", "Chat"])
                     if cat == 'Coffee':
-                        item_list = fetch_weekday_item(connection, cat)
+                        item_list = fetch_weekday_item(pool, cat)
                     elif cat == 'Tea':
-                        item_list = fetch_weekday_item(connection, cat)
+                        item_list = fetch_weekday_item(pool, cat)
                     else:
-                        item_list = fetch_weekday_item(connection, cat)
+                        item_list = fetch_weekday_item(pool, cat)
                         
                     item_dict = realign_list(item_list)
-                    daylist = fetch_weekday(connection)
+                    daylist = get_reference_data(pool).get("weekdays")
                     
                     col1, col2, col3, col4   = st.columns([3, 3, 1, 3])
                     with col1:
@@ -1788,7 +1991,8 @@ elif portal == "Corporate (Admin)":
 
                     submitted = st.button("Update Menu",key="upd-key")
                     if submitted:
-                        update_weekday_data(connection,item_selected,pwkday,wkday,del_flg)
+                        update_weekday_data(pool,item_selected,pwkday,wkday,del_flg)
+                        refresh_daily_specials()
                         st.success("Spl Menu Updated")
                     
                         
@@ -1796,66 +2000,22 @@ elif portal == "Corporate (Admin)":
             
     with tab_admin2:
         st.subheader("Sales Graphs")
-        period = st.selectbox("Period", ["Daily", "Weekly", "Monthly"])
-        category = st.selectbox("Rep_Category", ["Coffee", "Tea", "Chat", "Spl", "Overall"])
+        period = st.selectbox("Period", sales_engine.PERIODS)
+        category = st.selectbox("Rep_Category", list(sales_engine.CATEGORIES))
         if st.button("Generate Chart"):
-            if category == "Coffee":
-                fig = coffee_sales_fig(connection, period)
-                df = coffee_sales_data(connection, period)
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info("No coffee sales data.")
-                st.subheader(f"{period} Sales Data")
-                st.dataframe(df)
-            elif category == "Tea":
-                fig = tea_sales_fig(connection, period)
-                df = tea_sales_data(connection, period)
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info("No tea sales data.")
-                st.subheader(f"{period} Sales Data")
-                st.dataframe(df)
-            elif category == "Chat":
-                fig = chat_sales_fig(connection, period)
-                df = chat_sales_data(connection, period)
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info("No chat sales data.")
-                st.subheader(f"{period} Sales Data")
-                st.dataframe(df)
-            elif category == "Spl":
-                fig = Spl_sales_fig(connection, period)
-                df = Spl_sales_data(connection, period)
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info("No snacks sales data.")
-                st.subheader(f"{period} Sales Data")
-                st.dataframe(df)
+            sales = sales_engine.category_sales(pool, category, period)
+            if sales.figure:
+                st.pyplot(sales.figure)
             else:
-                fig = overall_sales_fig(connection, period)
-                df = overall_sales_data(connection, period)
-                if fig:
-                    st.pyplot(fig)
-                else:
-                    st.info("No sales data.")
-                st.subheader(f"{period} Sales Data")
-                st.dataframe(df)
+                st.info(sales.message)
+            st.subheader(f"{period} Sales Data")
+            st.dataframe(sales.df)
 
     with tab_admin3:
         st.subheader("Dynamic Reports")
         tabG, tabW, tabM, tabA  = st.tabs(["Generic Report", "WeeklyReport", "Monthly Report", "Report as Your Choice"])
         with tabG:
             st.title("User Option")
-            user_choice = st.radio(
-                "Do you need to write excel into local dir? (Y/N)", 
-                 options=["Y", "N"],
-                index=None,  
-                key="excel_radio"  
-                )
             report_choice = st.radio(
                 "Select Item for report generation", 
                  options=["Coffee", "Tea", "Chat", "Snacks", "All"],
@@ -1891,16 +2051,17 @@ elif portal == "Corporate (Admin)":
                     fp = open("./Files/pg_generic_snacks_sql.txt","r")
                     query = fp.read()
                     fp.close()
-                cursor = connection.cursor()
-                params = {
-                    'date_start': date_start,  
-                    'date_end': date_end       
-                }
-
-                cursor.execute(query, params)
-                rows = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
-                df_sales = pd.DataFrame(rows, columns=columns)
+                with pool.connection() as connection:
+                    cursor = connection.cursor()
+                    params = {
+                        'date_start': date_start,  
+                        'date_end': date_end       
+                    }
+
+                    cursor.execute(query, params)
+                    rows = cursor.fetchall()
+                    columns = [desc[0] for desc in cursor.description]
+                    df_sales = pd.DataFrame(rows, columns=columns)
                 df_sales.columns = df_sales.columns.str.lower()
                 st.dataframe(df_sales)
                 if not df_sales.empty :
@@ -1912,40 +2073,24 @@ elif portal == "Corporate (Admin)":
                     ax.set_title('Sales Breakdown by Item')
                     st.pyplot(fig_pie)
                 
-                    if user_choice == 'N' :
-                        output = io.BytesIO()
-                        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                            df_sales.to_excel(writer, index=False, sheet_name='Sales Data')
-                            output.seek(0)
-
-                        st.download_button(
-                            "Download Dynamic Excel", 
-                            output.getvalue(), 
-                            file_name='in_mem_dynamic_report.xlsx',
-                            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                        )
-
-                        st.success("Excel ready for download (generated in memory—no file written to disk).")
-                    else :
-                        file_name = os.path.join(REPORTS_DIR, f"dynamic_{report_choice}_sales_report.xlsx")
-                        df_sales.to_excel(file_name, index=False)
-                        with open(file_name, 'rb') as f:
-                            st.download_button("Download Dynamic Excel", f.read(), file_name=file_name)
+                    st.download_button(
+                        "Download Dynamic Excel", 
+                        excel_bytes(df_sales, 'Sales Data'), 
+                        file_name=f"dynamic_{report_choice}_sales_report.xlsx",
+                        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                    )
                 else:
                     st.info("No sales data for selected range.")
 
         with tabW:
             if st.button("Generate Xcel Report"):
-                df_sales =  pull_week_data(connection)
+                df_sales =  pull_week_data(pool)
                 st.dataframe(df_sales)
-                file_name = os.path.join(REPORTS_DIR,"dynamic_Weekly_report.xlsx")
-                df_sales.to_excel(file_name, index=False)
-                with open(file_name, 'rb') as f:
-                     st.download_button("Download Dynamic Excel", f.read(), file_name=file_name)
+                st.download_button("Download Dynamic Excel", excel_bytes(df_sales), file_name="dynamic_Weekly_report.xlsx")
                 
             
             if st.button("Show Visuals"):
-                item_lis = Week_sale_items(connection)
+                item_lis = Week_sale_items(pool)
                 days = sorted(set(item[0] for item in item_lis))  
                 item_types = sorted(set(item[1] for item in item_lis))
                 num_days = len(days)
@@ -1984,12 +2129,9 @@ elif portal == "Corporate (Admin)":
         with tabM:
             item_lis = []
             if st.button("Generate Monthly Xcel Report"):
-                df_sales =  pull_month_data(connection)
+                df_sales =  pull_month_data(pool)
                 st.dataframe(df_sales)
-                file_name = f"./reports/dynamic_Monthly_report.xlsx"
-                df_sales.to_excel(file_name, index=False)
-                with open(file_name, 'rb') as f:
-                     st.download_button("Download Dynamic Excel", f.read(), file_name=file_name)
+                st.download_button("Download Dynamic Excel", excel_bytes(df_sales), file_name="dynamic_Monthly_report.xlsx")
 
             option = st.selectbox(
                 label="Choose an option",
@@ -2000,7 +2142,7 @@ elif portal == "Corporate (Admin)":
                 
                 if option == "Item & Qty" :
                     
-                    item_lis = get_month_data(connection)
+                    item_lis = get_month_data(pool)
                     weeks = sorted(set(item[0] for item in item_lis))  
                     item_types = sorted(set(item[1] for item in item_lis))
                     num_weeks = len(weeks)
@@ -2038,7 +2180,7 @@ elif portal == "Corporate (Admin)":
 
                 else :
                     
-                    item_lis = get_month_data(connection)
+                    item_lis = get_month_data(pool)
                     weeks = sorted(set(item[0] for item in item_lis))  
                     item_types = sorted(set(item[1] for item in item_lis))
                     num_weeks = len(weeks)
@@ -2196,14 +2338,8 @@ elif portal == "Corporate (Admin)":
                     column_names.append(query_fields[i])
                 
             qry_str += " FROM sales_dtl_tbl "
-            if item_option == "Coffee" :
-                qry_str += " WHERE item_name IN (SELECT coffee_name FROM coffee_menu_tbl )"
-            elif item_option == "Tea" :
-                qry_str += " WHERE item_name IN (SELECT tea_name FROM tea_menu_tbl )"
-            elif item_option == "Chat" :
-                qry_str += " WHERE item_name IN (SELECT chat_name FROM chat_menu_tbl )"
-            else :
-                qry_str += " WHERE item_name IN (SELECT item_name FROM special_snacks_tbl )"
+            # item_option is one of the fixed category names recorded on each sale
+            qry_str += f" WHERE category = '{item_option}'"
 
             qry_str += f" AND value_date BETWEEN TO_DATE('{date_start}','YYYY-MM-DD') AND TO_DATE('{date_end}','YYYY-MM-DD')"
             if len(agg_fields) != 0 :
@@ -2257,172 +2393,104 @@ elif portal == "Corporate (Admin)":
                     st.code(sql_qry, language="sql")  
             
             if st.button(f"Generate {item_option} Sales Xcel Report"):
-                sales_rec = execute_qry(connection, qry_str,column_names)
+                sales_rec = execute_qry(pool, qry_str,column_names)
                 st.dataframe(sales_rec)
                 
-                file_name = f"./reports/dynamic_{item_option}_sales_report.xlsx"
-                sales_rec.to_excel(file_name, index=False)
-                with open(file_name, 'rb') as f:
-                     st.download_button("Download Dynamic Excel", f.read(), file_name=file_name)
+                st.download_button("Download Dynamic Excel", excel_bytes(sales_rec), file_name=f"dynamic_{item_option}_sales_report.xlsx")
 
         with tab_admin4:
             st.subheader("Process Bulk Orders")
-            order_list = {}
-            tot_price = 0.0
-            tot_tax = 0.0
+            orders = pd.DataFrame(columns=["Item Name", "Quantity", "spl_flag"])
             if 'bulk_lis' not in st.session_state:
                 st.session_state.bulk_lis = []
             tmp_lis = []
-            log_str = ""
             
-            log_path = os.path.join(BULK_DIR, "bulk_order.log")
-            file_path = os.path.join(BULK_DIR, "loaded_file.txt")
+            logger = logging.getLogger("bulk_import")
+
+            st.title("Bulk menu Reader")
+
+            st.warning("Upload an Excel, CSV or Parquet file with 2 columns Item name & Quantity")
+
+            uploaded_file = st.file_uploader("Upload the Order File", type=list(bulk_engine.FILE_FORMATS))
+            file = ""
+            digest = None
+            dup_file = 0
+            if uploaded_file is not None :
+                upload = st.session_state.get("bulk_upload")
+                # Hash, register and validate each upload once, not on every rerun
+                if upload is None or upload["file_id"] != uploaded_file.file_id :
+                    logger.info(f"Order file: {uploaded_file}")
+                    # Fingerprint before any parsing: same bytes under a new name are a duplicate
+                    name = os.path.splitext(uploaded_file.name)[0]
+                    digest = bulk_engine.content_hash(uploaded_file)
+                    registered = bulk_engine.register_upload(pool, name, digest)
+                    upload = {"file_id": uploaded_file.file_id, "name": name, "digest": digest,
+                              "registered": registered, "result": None, "error": None}
+                    log_sink = bulk_engine.BulkLogBuffer(pool, registered[0])
+                    log_sink.add("Loaded")
+                    if registered[1] != "Processed" :
+                        try:
+                            progress = st.progress(0.0, text="Reading order file...")
+
+                            def show_chunk(line_log, rows_read, total_rows):
+                                for message in line_log :
+                                    logger.info(message.rstrip())
+                                log_sink.extend(line_log)
+                                done = min(rows_read / total_rows, 1.0) if total_rows else 1.0
+                                progress.progress(done, text=f"Validated {rows_read} lines")
+
+                            upload["result"] = bulk_engine.validate_stream(
+                                pool, bulk_engine.iter_order_chunks(uploaded_file), on_chunk=show_chunk,
+                                index=get_reference_data(pool).get("bulk_catalog_index"))
+                            progress.progress(1.0, text=f"Validated {upload['result'][2]} lines")
+                        except bulk_engine.BulkFileError as e:
+                            upload["error"] = str(e)
+                        except Exception as e:
+                            upload["error"] = f"Error reading the order file: {e}"
+                    log_sink.flush()
+                    st.session_state.bulk_upload = upload
+                digest = upload["digest"]
+                known_name, status, is_new = upload["registered"]
+                if status == "Processed" :
+                    dup_file = 1
+                    st.error(f"Duplicate file loaded! Same content as '{known_name}', already processed today.")
+                elif not is_new and known_name != upload["name"] :
+                    st.info(f"Same content as '{known_name}' uploaded earlier today; continuing with that upload.")
+                file = known_name
+
+            if uploaded_file is not None and dup_file == 0 :
+                if upload["error"] :
+                    st.error(upload["error"])
+                else :
+                    orders, rejected, line_cnt, tot_qty = upload["result"]
+                    st.write("### Bulk Orders from File")
+                    st.dataframe(orders[["Item Name", "Quantity"]])
+                    if not rejected.empty:
+                        st.write("### Rejected Lines")
+                        st.dataframe(rejected[["Item Name", "Quantity", "Reason", "Suggestion", "Score"]])
+
+                    st.write("### Summary")
+                    st.write(f"Total loaded Items: {line_cnt}")
+                    st.write(f"Total loaded Quantity: {tot_qty}")
+            else:
+                st.info("Upload the bulk order file to process!")
 
-            logging.basicConfig(level=logging.INFO, filename=os.path.join(BULK_DIR, 'bulk_order.log'), force=True)
-            logger = logging.getLogger()
-            logger.info("App started")
-            
-            with open(log_path,"a") as fp :
-            
-                current_date = date.today()
-            
-                print(f"Log date: {current_date}\n",file=fp)
-                log_str += f"Log date: {current_date}\n"
-            
-                st.title("Bulk menu Reader")
-                fname = open(file_path,"w")
-
-                st.warning("Upload Xcel file with 2 columns Item name & Quantity")
-
-                uploaded_file = st.file_uploader("Upload the Order File", type=["xlsx", "xls"])
-                print(f"Order file: {uploaded_file}\n",file=fp)
-                log_str += f"Order file: {uploaded_file}\n"
-                if uploaded_file is not None :
-                    target_path = os.path.join(BULK_DIR, "bulk_order.xlsx")
-                    with open(target_path, "wb") as f:
-                        f.write(uploaded_file.getvalue())
-                        f.close()
-                    fname.write(log_str)
-                fname.close()
-                fname = open(file_path,"r")
-                file=""
-                pattern = r"name='([^']+)[.]"
-                for line in fname.readlines():
-                    match =  re.search(pattern,line)
-                    if match :
-                        file = match.group(1)
-                dup_file = check_bulk_header(connection,file)
-                
-                if dup_file == 1 :
+            if st.button("Process Order") :
+                if uploaded_file is None or not file :
+                    st.error("Upload the bulk order file to process!")
+                elif dup_file == 1 :
                     st.error("Duplicate file loaded!")
-                status = "OPEN"
-                load_bulk_header(connection,file, status)
-                message = "Loaded"
-                insert_log(connection,file,message)
-                fname.close()
-
-                if uploaded_file is not None and dup_file == 0 :
-                    try:
-                        df = pd.read_excel(uploaded_file)
-        
-                        required_columns = ["Item name", "Quantity"]
-                        if all(col in df.columns for col in required_columns):
-                            df = df[required_columns]
-            
-                            st.write("### Bulk Orders from File")
-                            st.dataframe(df)
-                            for index, row in df.iterrows():
-                                item_name = row["Item name"]
-                                valid = validate_item(connection,item_name)
-                            
-                                if valid == 0 :
-                                    print(f"Invalid item- {item_name}\n",file=fp)
-                                    log_str += f"Invalid item- {item_name}\n"
-                                    message = f"Invalid item- {item_name}\n"
-                                    insert_log(connection,file,message)
-                                    continue
-                            
-                                quantity = row["Quantity"]
-                            
-                                if quantity < 0 or quantity > 100 :
-                                    print(f"Invalid quantity - {item_name}\n", file=fp)
-                                    log_str += f"Invalid quantity - {item_name}\n"
-                                    message = f"Invalid quantity - {item_name}\n"
-                                    insert_log(connection,file,message)
-                                else :
-                                    order_list[item_name] = quantity
-                                    print(f"Feteching Item - {item_name}\n", file=fp)
-                                    log_str += f"Feteching Item - {item_name}\n"
-                                    message = f"Feteching Item - {item_name}\n"
-                                    insert_log(connection,file,message)
-                                    fp.flush()
-                        
-                            st.write("### Summary")
-                            st.write(f"Total loaded Items: {len(df)}")
-                            st.write(f"Total loaded Quantity: {df['Quantity'].sum()}")
-                        
-                        else:
-                            st.error("The Excel file must contain 'Item name' and 'Quantity' columns.")
-            
-                    except Exception as e:
-                        st.error(f"Error reading the Excel file: {e}")
-                else:
-                    st.info("Upload the bulk order file to process!")
+                elif bulk_engine.enqueue_job(pool, digest, uploaded_file.getvalue()) :
+                    bulk_workers.wake()
+                    logger.info(f"Queued {file} for processing")
+                    st.success(f"{file} queued for processing.")
+                else :
+                    st.warning(f"{file} is already queued or running.")
+            show_bulk_jobs(pool, file, digest)
 
-                if st.button("Process Order") :
-                
-                    st.write("Processed Orders ###")
-                    st.session_state.bulk_lis = []
-                    for item, qty in order_list.items() :
-                        avail_stock, qty = get_item_stock(connection, item, qty)
-                        if qty != 0 :
-                            price, tax = get_item_price(connection,item,qty)
-                            print(f"processing {item} and quantity : {qty}\n",file=fp)
-                            log_str += f"processing {item} and quantity : {qty}\n"
-                            message = f"processing {item} and quantity : {qty}\n"
-                            insert_log(connection,file,message)
-                            tot_price += float(price)
-                            tot_tax += float(tax)
-                            tmp_lis = [item,qty,price,tax]
-                            st.session_state.bulk_lis.append(tmp_lis)
-                        else :
-                            print(f"{item} {qty} - Rejected due to stock shortage\n",file=fp)
-                            log_str += f"{item} {qty} - Rejected due to stock shortage\n"
-                            message = f"{item} {qty} - Rejected due to stock shortage\n"
-                            insert_log(connection,file,message)
-                            fp.flush()
-                    df = pd.DataFrame(st.session_state.bulk_lis, columns = ["Item Name","Quantity","Price","Tax"])
-                    st.dataframe(df)
-                    col1, col2, col3 = st.columns(3)
-                    col1.metric("Subtotal", f"Rs.{tot_price:.2f}")
-                    col2.metric("Tax Amt", f"Rs.{tot_tax:.2f}")
-                    col3.metric("Tot. Bill Amt", f"Rs.{tot_price+tot_tax:.2f}")
-                    print(f"Tot. Bill Amt For current order", f"Rs.{tot_price+tot_tax:.2f}",file=fp)
-                    log_str += f"Tot. Bill Amt For current order, Rs.{tot_price+tot_tax:.2f}"
-                    message = f"Tot. Bill Amt For current order =  Rs.{tot_price+tot_tax:.2f}"
-                    insert_log(connection,file,message)
-                    fp.close()
-                    status = "Processed"
-                    update_bulk_header(connection,file,status)
-                    insert_db_data(connection, st.session_state.bulk_lis)
-                    fig_pie, ax = plt.subplots()
-                    
-                    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
-                    sales_by_item = df.groupby('Item Name')['Quantity'].sum()
-                    
-                    
-                    if len(sales_by_item) > 0 :
-                        sales_by_item.plot(kind='pie', ax=ax, autopct='%1.1f%%', labels=sales_by_item.index)
-                        ax.set_title('Sales Breakdown by Item')
-                        st.pyplot(fig_pie)
-
-                if st.button(f"Generate Bill in Xcel Report"):
-                    bill_rec = pd.DataFrame(st.session_state.bulk_lis, columns = ["Item Name","Quantity","Price","Tax"])
-                                
-                    file_name = f"./reports/Bill_Statement.xlsx"
-                    bill_rec.to_excel(file_name, index=False)
-                    with open(file_name, 'rb') as f:
-                         st.download_button("Download Bill Statement", f.read(), file_name=file_name)
+            if st.button(f"Generate Bill in Xcel Report"):
+                bill_rec = pd.DataFrame(st.session_state.bulk_lis, columns = ["Item Name","Quantity","Price","Tax"])
+                st.download_button("Download Bill Statement", excel_bytes(bill_rec), file_name=f"{file or 'Bill'}_Statement.xlsx")
 
 
 # Footer
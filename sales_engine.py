@@ -0,0 +1,175 @@
+"""Sales rows, the daily sales rollup and category sales reports.
+
+record_sales() inserts sales_dtl_tbl rows with their category (from
+item_category_vw at the time of sale, 'Other' if the item is on no menu)
+and folds them into sales_daily_rollup_tbl in the same statement. The
+rollup holds one row per (value_date, item_name, category) with the summed
+quantity and sales amount, so reports aggregate days x items instead of
+every sale line; rebuild_rollup() recomputes it from the detail rows
+(backfill and repair).
+
+category_sales(pool, category, period) runs one parameterized aggregate over
+the rollup and returns a SalesResult carrying the DataFrame; its figure is
+only drawn when first used, from the same rows.
+"""
+from datetime import date, timedelta
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+PERIODS = ("Daily", "Weekly", "Monthly")
+
+# category -> (sales row category, chart title, x-axis label, empty-result message)
+CATEGORIES = {
+    "Coffee": ("Coffee", "Coffee Sales", "Coffee Flavor", "No coffee sales data."),
+    "Tea": ("Tea", "Tea Sales", "Tea Type", "No tea sales data."),
+    "Chat": ("Chat", "Chat Sales", "Chat Type", "No chat sales data."),
+    "Spl": ("Snacks", "Snacks Sales", "Snack Type", "No snacks sales data."),
+    "Overall": (None, "OverAll Sales", "Item Type", "No sales data."),
+}
+
+_RECORD_SALES_SQL = """
+    WITH r AS (
+        SELECT r.value_date::date AS value_date, r.item_name, r.quantity::numeric AS quantity,
+               r.sales_amt::numeric AS sales_amt, COALESCE(c.category, 'Other') AS category, r.ord
+        FROM unnest(%(dates)s::text[], %(items)s::text[], %(qtys)s::text[], %(amts)s::text[])
+             WITH ORDINALITY AS r(value_date, item_name, quantity, sales_amt, ord)
+        LEFT JOIN item_category_vw c ON c.item_name = r.item_name
+    ), dtl AS (
+        INSERT INTO sales_dtl_tbl (value_date, item_name, quantity, sales_amt, category)
+        SELECT value_date, item_name, quantity, sales_amt, category FROM r ORDER BY ord
+    )
+    INSERT INTO sales_daily_rollup_tbl AS t (value_date, item_name, category, quantity, sales_amt, line_count)
+    SELECT value_date, item_name, category, SUM(quantity), SUM(sales_amt), COUNT(*)
+    FROM r
+    GROUP BY value_date, item_name, category
+    ON CONFLICT (value_date, item_name, category) DO UPDATE
+    SET quantity = t.quantity + EXCLUDED.quantity,
+        sales_amt = t.sales_amt + EXCLUDED.sales_amt,
+        line_count = t.line_count + EXCLUDED.line_count
+"""
+
+_ROLLUP_REBUILD_SQL = """
+    INSERT INTO sales_daily_rollup_tbl (value_date, item_name, category, quantity, sales_amt, line_count)
+    SELECT s.value_date::date, s.item_name, COALESCE(s.category, 'Other'),
+           SUM(s.quantity), SUM(s.sales_amt), COUNT(*)
+    FROM sales_dtl_tbl s
+    WHERE (%(start)s::date IS NULL OR s.value_date >= %(start)s::date)
+      AND (%(end)s::date IS NULL OR s.value_date < %(end)s::date)
+    GROUP BY 1, 2, 3
+"""
+
+_CATEGORY_SALES_SQL = """
+    SELECT item_name, SUM(quantity) AS qty
+    FROM sales_daily_rollup_tbl
+    WHERE value_date >= %(start)s AND value_date < %(end)s
+      AND (%(cat)s::text IS NULL OR category = %(cat)s)
+    GROUP BY item_name
+"""
+
+
+def record_sales(connection, rows):
+    """Insert (value_date, item, qty, sales_amt) rows into sales_dtl_tbl and the rollup; the caller commits.
+
+    One statement categorises the rows, inserts them and upserts their daily
+    totals. No explicit lock is taken: the upsert holds the ROW EXCLUSIVE
+    table lock every write takes on the rollup until the caller commits, and
+    that conflicts with rebuild_rollup()'s EXCLUSIVE lock, so a concurrent
+    rebuild either sees these rows or runs before them.
+    """
+    if not rows:
+        return 0
+    dates, items, qtys, amts = (list(col) for col in zip(*rows))
+    cursor = connection.cursor()
+    cursor.execute(_RECORD_SALES_SQL, {"dates": dates, "items": items, "qtys": qtys, "amts": amts})
+    cursor.close()
+    return len(rows)
+
+
+def rebuild_rollup(pool, start=None, end=None, only_if_empty=False):
+    """Recompute the rollup for value_date in [start, end) (all dates by default) from sales_dtl_tbl.
+
+    The EXCLUSIVE lock holds off record_sales() for the duration, so sales
+    committed meanwhile are counted exactly once. With only_if_empty nothing
+    is done unless the rollup has no rows (first-time backfill). Returns the
+    rollup rows written, or None when skipped.
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("LOCK TABLE sales_daily_rollup_tbl IN EXCLUSIVE MODE")
+        if only_if_empty:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM sales_daily_rollup_tbl)")
+            if cursor.fetchone()[0]:
+                cursor.close()
+                connection.rollback()
+                return None
+        cursor.execute("DELETE FROM sales_daily_rollup_tbl "
+                       "WHERE (%(start)s::date IS NULL OR value_date >= %(start)s::date) "
+                       "AND (%(end)s::date IS NULL OR value_date < %(end)s::date)", {"start": start, "end": end})
+        cursor.execute(_ROLLUP_REBUILD_SQL, {"start": start, "end": end})
+        rec_cnt = cursor.rowcount
+        cursor.close()
+        connection.commit()
+    return rec_cnt
+
+
+def period_bounds(period, today=None):
+    """[start, end) dates of a Daily, Weekly (from Monday) or Monthly period containing today."""
+    today = today or date.today()
+    if period == "Daily":
+        start = today
+    elif period == "Weekly":
+        start = today - timedelta(days=today.weekday())
+    elif period == "Monthly":
+        start = today.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    else:
+        raise ValueError(f"Unknown period: {period}")
+    return start, today + timedelta(days=1)
+
+
+class SalesResult:
+    """Per-item quantities of one category and period; figure is built on first access."""
+
+    def __init__(self, category, period, df):
+        self.category = category
+        self.period = period
+        self.df = df
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    @property
+    def message(self):
+        return CATEGORIES[self.category][3]
+
+    @cached_property
+    def figure(self):
+        """Bar chart of the quantities, or None when there are no sales."""
+        if self.df.empty:
+            return None
+        import matplotlib.pyplot as plt
+        _, title, xlabel, _ = CATEGORIES[self.category]
+        fig, ax = plt.subplots()
+        self.df.plot(kind='bar', x='Item', y='Quantity', ax=ax, color=plt.cm.Set3(np.linspace(0, 1, len(self.df))),
+                     title=f'{title} ({self.period.capitalize()})')
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel('Sales Quantity')
+        return fig
+
+
+def category_sales(pool, category, period, today=None):
+    """Sales quantity per item of a category ("Overall" for all items) over a period, from the rollup."""
+    if category not in CATEGORIES:
+        raise ValueError(f"Unknown category: {category}")
+    start, end = period_bounds(period, today)
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(_CATEGORY_SALES_SQL, {"cat": CATEGORIES[category][0], "start": start, "end": end})
+        rows = cursor.fetchall()
+        cursor.close()
+    df = pd.DataFrame(rows, columns=['Item', 'Quantity'])
+    df['Quantity'] = pd.to_numeric(df['Quantity'], errors='coerce')
+    return SalesResult(category, period, df)
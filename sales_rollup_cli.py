@@ -0,0 +1,46 @@
+"""Backfill or rebuild the daily sales rollup from sales_dtl_tbl.
+
+    python sales_rollup_cli.py                      # rebuild every date
+    python sales_rollup_cli.py --start 2025-10-01   # rebuild from a date
+    python sales_rollup_cli.py --start 2025-10-01 --end 2025-11-01
+    python sales_rollup_cli.py --if-empty           # first-time backfill only
+
+--end is exclusive. Database settings come from the same environment
+variables as the app (DB_HOST, DB_PORT, DB_NAME, DBP_USER, DBP_PASSWORD).
+"""
+import argparse
+import logging
+import sys
+from datetime import date
+
+from dotenv import load_dotenv
+
+import db
+import migrations
+import sales_engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild sales_daily_rollup_tbl from sales_dtl_tbl.")
+    parser.add_argument("--start", type=date.fromisoformat, help="first value_date to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, help="value_date to stop before (YYYY-MM-DD)")
+    parser.add_argument("--if-empty", action="store_true", help="only backfill when the rollup has no rows")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    pool = db.open_pool(1, "sales-rollup-cli")
+    try:
+        migrations.apply(pool, db.MIGRATIONS_DIR)
+        rec_cnt = sales_engine.rebuild_rollup(pool, args.start, args.end, only_if_empty=args.if_empty)
+    finally:
+        pool.close()
+    if rec_cnt is None:
+        print("Rollup already populated; nothing done.")
+    else:
+        print(f"Rebuilt {rec_cnt} rollup rows.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
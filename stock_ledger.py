@@ -0,0 +1,240 @@
+"""Append-only stock movement ledger.
+
+Every stock change (SALE, CANCEL, BULK, REPLENISH) is an INSERT into
+stock_movement_tbl instead of an UPDATE of the item's STOCK_MAINTENANCE_TXN_TBL
+row. That row is the cached running balance: compact() periodically folds
+the movements recorded since its compacted_through id into avail_stock, and
+stock_balance_vw adds the (short) uncompacted tail on top of it.
+
+Functions take a psycopg pool or a borrowed connection and never commit on
+behalf of a caller that passed a connection. StockSnapshot is the
+process-wide read cache of today's balances.
+"""
+import threading
+import time
+from datetime import date
+from types import MappingProxyType
+
+STOCK_ROLLOVER_LOCK_KEY = 5301  # pg advisory lock id shared by all replicas
+# Two-key advisory locks live in a different key space from the single-key
+# STOCK_ROLLOVER_LOCK_KEY, so the class id only has to be unique here.
+ITEM_LOCK_CLASS = 5302
+
+_ROLLOVER_SQL = """
+    INSERT INTO STOCK_MAINTENANCE_TXN_TBL (value_date, item_name, avail_stock)
+    SELECT CURRENT_DATE, s.item_name, s.total_stock FROM STOCK_MAINTENANCE_TBL s
+    WHERE s.delete_flag='N'
+      AND NOT EXISTS (SELECT 1 FROM STOCK_MAINTENANCE_TXN_TBL t WHERE t.value_date = CURRENT_DATE AND t.item_name = s.item_name)
+"""
+
+_LOCK_ITEM_SQL = "SELECT pg_advisory_xact_lock(%(cls)s, hashtext(%(itm)s))"
+
+# Locks are taken in key order: names whose hashes collide share one lock,
+# so ordering by name could still acquire the same keys in different orders.
+_LOCK_ITEMS_SQL = """
+    SELECT pg_advisory_xact_lock(%(cls)s, k)
+    FROM (SELECT DISTINCT hashtext(itm) AS k FROM unnest(%(items)s::text[]) AS u(itm) ORDER BY k) s
+"""
+
+_REPLENISH_SQL = """
+    INSERT INTO stock_movement_tbl (item_name, movement_type, quantity, reference)
+    SELECT item_name, 'REPLENISH', %(level)s - avail_stock, %(ref)s FROM stock_balance_vw
+    WHERE value_date = CURRENT_DATE AND avail_stock <= 0
+    RETURNING item_name
+"""
+
+_COMPACT_SQL = """
+    WITH d AS (
+        SELECT m.value_date, m.item_name, SUM(m.quantity) AS qty, MAX(m.movement_id) AS last_id
+        FROM stock_movement_tbl m
+        JOIN STOCK_MAINTENANCE_TXN_TBL t
+          ON t.value_date = m.value_date AND t.item_name = m.item_name AND m.movement_id > t.compacted_through
+        GROUP BY m.value_date, m.item_name
+    )
+    UPDATE STOCK_MAINTENANCE_TXN_TBL t
+    SET avail_stock = t.avail_stock + d.qty, compacted_through = d.last_id
+    FROM d
+    WHERE t.value_date = d.value_date AND t.item_name = d.item_name
+"""
+
+
+def rollover_daily_stock(pool):
+    """Create today's snapshot rows from STOCK_MAINTENANCE_TBL if missing; returns rows inserted.
+
+    The advisory lock serialises replicas that roll over at the same moment and
+    the NOT EXISTS makes the set-based insert a no-op for items already present.
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (STOCK_ROLLOVER_LOCK_KEY,))
+        cursor.execute(_ROLLOVER_SQL)
+        rec_cnt = cursor.rowcount
+        cursor.close()
+        connection.commit()
+    return rec_cnt
+
+
+def lock_item_statement(item):
+    """(query, params) that serialises stock decrements of one item until the surrounding transaction ends."""
+    return _LOCK_ITEM_SQL, {"cls": ITEM_LOCK_CLASS, "itm": item}
+
+
+def lock_items(cursor, items):
+    """lock_item_statement() for several items, taken in lock key order so concurrent callers cannot deadlock."""
+    cursor.execute(_LOCK_ITEMS_SQL, {"cls": ITEM_LOCK_CLASS, "items": list(items)})
+
+
+def replenish_shortages(pool, level, reference=None):
+    """Top every sold-out item up to level with REPLENISH movements; returns the items replenished.
+
+    The SHARE ROW EXCLUSIVE lock waits for in-flight movements, locked
+    decrements and unlocked increments alike, to commit and holds off new
+    ones until the REPLENISH rows commit, so every top-up is computed from
+    the item's final balance and lands exactly on level.
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("LOCK TABLE stock_movement_tbl IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(_REPLENISH_SQL, {"level": int(level), "ref": reference})
+        items = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        connection.commit()
+    return items
+
+
+def get_balances(pool, shortage_only=False):
+    """Current balance per item for today, {item: avail_stock}."""
+    sel_qry = "SELECT item_name, avail_stock FROM stock_balance_vw WHERE value_date = CURRENT_DATE"
+    if shortage_only:
+        sel_qry += " AND avail_stock <= 0"
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(sel_qry)
+        balances = {row[0]: int(row[1]) for row in cursor.fetchall()}
+        cursor.close()
+    return balances
+
+
+def get_stamped_balances(pool):
+    """Current balance per item for today with the id of its last movement, {item: (avail_stock, movement_id)}.
+
+    Items deleted from STOCK_MAINTENANCE_TBL since the rollover are left out.
+    """
+    sel_qry = ("SELECT b.item_name, b.avail_stock, b.last_movement_id FROM stock_balance_vw b "
+               "WHERE b.value_date = CURRENT_DATE AND EXISTS (SELECT 1 FROM STOCK_MAINTENANCE_TBL s "
+               "WHERE s.item_name = b.item_name AND s.delete_flag = 'N')")
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(sel_qry)
+        balances = {row[0]: (int(row[1]), int(row[2])) for row in cursor.fetchall()}
+        cursor.close()
+    return balances
+
+
+def get_movements(pool, item=None, limit=200):
+    """Latest ledger rows for today, newest first, as a list of tuples (audit view)."""
+    sel_qry = ("SELECT movement_id, created_at, item_name, movement_type, quantity, reference "
+               "FROM stock_movement_tbl WHERE value_date = CURRENT_DATE")
+    params = {"limit": int(limit)}
+    if item:
+        sel_qry += " AND item_name = %(itm)s"
+        params["itm"] = item
+    sel_qry += " ORDER BY movement_id DESC LIMIT %(limit)s"
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(sel_qry, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def compact(pool, lock_timeout="5s"):
+    """Fold uncompacted movements into the daily snapshot rows; returns rows updated.
+
+    The SHARE lock waits for in-flight movement inserts to commit and holds off
+    new ones for the duration of one UPDATE, so no movement id below the new
+    watermark can commit afterwards. Ledger rows themselves are kept.
+    """
+    with pool.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", (lock_timeout,))
+        cursor.execute("LOCK TABLE stock_movement_tbl IN SHARE MODE")
+        cursor.execute(_COMPACT_SQL)
+        rec_cnt = cursor.rowcount
+        cursor.close()
+        connection.commit()
+    return rec_cnt
+
+
+class StockSnapshot:
+    """One read-only {item: avail_stock} view of today's stock shared by all sessions.
+
+    The whole mapping is reloaded at most every ttl seconds; levels this
+    process learns from its own writes are published immediately by swapping
+    in an updated copy, so readers never see a half-applied change.
+    Every level carries the id of the last stock movement behind it, and a
+    level only replaces one with a lower id, so a late publish or a reload
+    that started before a write can never put an older reading back. The
+    first reload of a new day starts from an empty mapping, since a fresh
+    day's rows carry no movements yet, and every reload drops items that are
+    no longer in the stock catalog.
+    Sessions keep only their cart.
+    """
+
+    def __init__(self, pool, ttl, today=date.today):
+        self._pool = pool
+        self._ttl = ttl
+        self._today = today
+        self._lock = threading.Lock()
+        self._levels = MappingProxyType({})
+        self._stamps = {}  # item -> movement id of its current level
+        self._day = None
+        self._loaded_at = None
+        self.reloads = 0
+
+    def _merge(self, stamped, full=False):
+        """Swap in a copy holding the entries of {item: (level, movement_id)} newer than the current ones.
+
+        With full, stamped is a complete reload and items missing from it
+        (deleted from the stock catalog) are dropped.
+        """
+        merged = dict(self._levels)
+        if full:
+            for item in set(merged) - set(stamped):
+                del merged[item]
+                self._stamps.pop(item, None)
+        for item, (level, movement_id) in stamped.items():
+            if movement_id >= self._stamps.get(item, 0):
+                merged[item] = level
+                self._stamps[item] = movement_id
+        self._levels = MappingProxyType(merged)
+
+    def get(self):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self._ttl:
+                return self._levels
+        day = self._today()
+        stamped = get_stamped_balances(self._pool)
+        with self._lock:
+            if day != self._day:
+                self._levels = MappingProxyType({})
+                self._stamps = {}
+                self._day = day
+            self._merge(stamped, full=True)
+            self._loaded_at = time.monotonic()
+            self.reloads += 1
+            return self._levels
+
+    def level(self, item):
+        return self.get().get(item, 0)
+
+    def publish(self, levels):
+        """Apply {item: (level, movement_id)} results of this process's own stock writes."""
+        if not levels:
+            return
+        with self._lock:
+            self._merge(levels)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
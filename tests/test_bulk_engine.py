@@ -0,0 +1,145 @@
+import contextlib
+import io
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import bulk_engine
+
+
+@pytest.fixture
+def index():
+    return bulk_engine.CatalogIndex([("Masala Dosa", "N"), ("Idli", "N"), ("Paneer Tikka", "Y")])
+
+
+def order(rows):
+    return pd.DataFrame(rows, columns=["Item name", "Quantity"])
+
+
+def test_validate_order_keeps_first_position_and_last_quantity(index):
+    orders, rejected, log = bulk_engine.validate_order(
+        None, order([("Idli", 2), ("Masala Dosa", 1), ("idli", 5)]), index)
+    assert orders.values.tolist() == [["Idli", 5, "N"], ["Masala Dosa", 1, "N"]]
+    assert rejected.empty
+    assert log == ["Feteching Item - Idli\n", "Feteching Item - Masala Dosa\n", "Feteching Item - Idli\n"]
+
+
+@pytest.mark.parametrize("qty, reason", [
+    (-1, "Invalid quantity"),
+    (101, "Invalid quantity"),
+    ("two", "Invalid quantity"),
+    (1.5, "Fractional quantity"),
+])
+def test_validate_order_rejects_bad_quantities(index, qty, reason):
+    orders, rejected, log = bulk_engine.validate_order(None, order([("Idli", qty), ("Masala Dosa", 3)]), index)
+    assert orders["Item Name"].tolist() == ["Masala Dosa"]
+    assert rejected["Reason"].tolist() == [reason]
+    assert log[0] == "Invalid quantity - Idli\n"
+
+
+def test_validate_order_accepts_quantity_bounds(index):
+    orders, rejected, _ = bulk_engine.validate_order(None, order([("Idli", 0), ("Masala Dosa", 100.0)]), index)
+    assert orders["Quantity"].tolist() == [0, 100]
+    assert rejected.empty
+
+
+def test_validate_order_rejects_unknown_item_with_suggestion(index):
+    orders, rejected, log = bulk_engine.validate_order(None, order([("Masala Dosai", 1)]), index)
+    assert orders.empty
+    assert rejected.loc[0, "Reason"] == "Invalid item"
+    assert rejected.loc[0, "Suggestion"] == "Masala Dosa"
+    assert log == ["Invalid item- Masala Dosai\n"]
+
+
+def test_validate_order_carries_spl_flag(index):
+    orders, _, _ = bulk_engine.validate_order(None, order([("paneer  tikka", 1)]), index)
+    assert orders.values.tolist() == [["Paneer Tikka", 1, "Y"]]
+
+
+def csv_bytes(rows):
+    return order(rows).to_csv(index=False).encode()
+
+
+def xlsx_bytes(rows):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["Item name", "Quantity"])
+    for row in rows:
+        sheet.append(list(row))
+    buf = io.BytesIO()
+    workbook.save(buf)
+    return buf.getvalue()
+
+
+def parquet_bytes(rows):
+    buf = io.BytesIO()
+    order(rows).to_parquet(buf, index=False)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("make, fmt", [(csv_bytes, "csv"), (xlsx_bytes, "xlsx"), (parquet_bytes, "parquet")])
+def test_iter_order_chunks_sniffs_format(make, fmt):
+    rows = [("Idli", 1), ("Masala Dosa", 2), ("Idli", 3)]
+    data = make(rows)
+    assert bulk_engine.detect_format(io.BytesIO(data)) == fmt
+    chunks = list(bulk_engine.iter_order_chunks(io.BytesIO(data), chunk_rows=2))
+    assert [rows_read for _, rows_read, _ in chunks] == [2, 3]
+    frame = pd.concat([chunk for chunk, _, _ in chunks], ignore_index=True)
+    assert [tuple(row) for row in frame.values.tolist()] == rows
+
+
+def test_iter_order_chunks_rejects_missing_columns():
+    data = pd.DataFrame({"Item": ["Idli"], "Qty": [1]}).to_csv(index=False).encode()
+    with pytest.raises(bulk_engine.BulkFileError):
+        list(bulk_engine.iter_order_chunks(io.BytesIO(data)))
+
+
+def test_iter_order_chunks_rejects_oversized_files():
+    with pytest.raises(bulk_engine.BulkFileError):
+        list(bulk_engine.iter_order_chunks(io.BytesIO(csv_bytes([("Idli", 1)])), max_bytes=10))
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self._results = results
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+
+    def fetchone(self):
+        return self._results[len(self.executed) - 1]
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """A pool whose single connection answers the nth execute with results[n]."""
+
+    def __init__(self, results):
+        self._cursor = FakeCursor(results)
+
+    @contextlib.contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        pass
+
+
+def test_register_upload_new_content():
+    pool = FakePool([("orders", "OPEN", True)])
+    assert bulk_engine.register_upload(pool, "orders", "ab" * 32) == ("orders", "OPEN", True)
+    assert len(pool._cursor.executed) == 1
+
+
+def test_register_upload_rereads_row_committed_during_insert():
+    # The insert lost to a concurrent upload that its snapshot cannot see
+    pool = FakePool([None, ("orders_copy", "RUNNING", False)])
+    assert bulk_engine.register_upload(pool, "orders", "ab" * 32) == ("orders_copy", "RUNNING", False)
+    assert pool._cursor.executed[1] is bulk_engine._REGISTERED_SQL
@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+import bulk_engine
+
+
+@pytest.fixture
+def index():
+    return bulk_engine.CatalogIndex([("Masala Dosa", "N"), ("Onion Uttapam", "N"), ("Filter Coffee", "N")])
+
+
+def test_normalize_name_casefolds_and_collapses_whitespace():
+    assert bulk_engine.normalize_name("  Masala\tDOSA  ") == "masala dosa"
+    assert bulk_engine.normalize_name(12) == "12"
+
+
+def test_trigrams_are_padded():
+    assert bulk_engine._trigrams("ab") == ["  a", " ab", "ab "]
+
+
+def test_resolve_prefers_exact_then_normalized(index):
+    result = index.resolve(pd.Series(["Masala Dosa", "masala   dosa", "FILTER COFFEE"]))
+    assert result["Item"].tolist() == ["Masala Dosa", "Masala Dosa", "Filter Coffee"]
+    assert result["Match"].tolist() == ["exact", "normalized", "normalized"]
+    assert result["Suggestion"].isna().all()
+
+
+def test_resolve_suggests_closest_name_for_misses(index):
+    result = index.resolve(pd.Series(["Onion Utapam", "Filtr Cofee"]))
+    assert result["Item"].isna().all()
+    assert result["Suggestion"].tolist() == ["Onion Uttapam", "Filter Coffee"]
+    assert ((result["Score"] >= bulk_engine.SUGGEST_MIN_SCORE) & (result["Score"] < 1)).all()
+
+
+def test_resolve_drops_weak_suggestions(index):
+    result = index.resolve(pd.Series(["xyz"]))
+    assert result.loc[0, "Item"] is None
+    assert pd.isna(result.loc[0, "Suggestion"])
+    assert pd.isna(result.loc[0, "Score"])
+
+
+def test_resolve_keeps_the_input_index_and_skips_blanks(index):
+    result = index.resolve(pd.Series(["Masala Dosa", None], index=[7, 9]))
+    assert list(result.index) == [7, 9]
+    assert result.loc[9, "Item"] is None
+    assert pd.isna(result.loc[9, "Suggestion"])
@@ -0,0 +1,40 @@
+import hashlib
+
+import pytest
+
+import db
+import migrations
+
+
+def write(directory, name, text):
+    (directory / name).write_text(text)
+
+
+def test_load_migrations_orders_by_version_and_checksums(tmp_path):
+    write(tmp_path, "010_later.txt", "SELECT 10;")
+    write(tmp_path, "002_second.txt", "SELECT 2;")
+    write(tmp_path, "001_first.txt", "SELECT 1;")
+    write(tmp_path, "README.md", "not a migration")
+    write(tmp_path, "3_bad-name.txt", "ignored")
+    loaded = migrations.load_migrations(str(tmp_path))
+    assert [(m.version, m.name) for m in loaded] == [(1, "first"), (2, "second"), (10, "later")]
+    assert loaded[0].checksum == hashlib.sha256(b"SELECT 1;").hexdigest()
+
+
+def test_load_migrations_checksum_tracks_content(tmp_path):
+    write(tmp_path, "001_first.txt", "SELECT 1;")
+    before = migrations.load_migrations(str(tmp_path))[0].checksum
+    write(tmp_path, "001_first.txt", "SELECT 1; -- edited")
+    assert migrations.load_migrations(str(tmp_path))[0].checksum != before
+
+
+def test_load_migrations_rejects_repeated_version(tmp_path):
+    write(tmp_path, "001_first.txt", "SELECT 1;")
+    write(tmp_path, "01_again.txt", "SELECT 1;")
+    with pytest.raises(migrations.MigrationError):
+        migrations.load_migrations(str(tmp_path))
+
+
+def test_shipped_migrations_are_numbered_without_gaps():
+    versions = [m.version for m in migrations.load_migrations(db.MIGRATIONS_DIR)]
+    assert versions == list(range(1, len(versions) + 1))
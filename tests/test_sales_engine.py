@@ -0,0 +1,22 @@
+from datetime import date
+
+import pytest
+
+import sales_engine
+
+
+@pytest.mark.parametrize("period, today, bounds", [
+    ("Daily", date(2025, 10, 15), (date(2025, 10, 15), date(2025, 10, 16))),
+    ("Weekly", date(2025, 10, 15), (date(2025, 10, 13), date(2025, 10, 16))),
+    ("Weekly", date(2025, 10, 13), (date(2025, 10, 13), date(2025, 10, 14))),
+    ("Monthly", date(2025, 10, 31), (date(2025, 10, 1), date(2025, 11, 1))),
+    ("Monthly", date(2025, 12, 5), (date(2025, 12, 1), date(2026, 1, 1))),
+    ("Monthly", date(2024, 2, 29), (date(2024, 2, 1), date(2024, 3, 1))),
+])
+def test_period_bounds(period, today, bounds):
+    assert sales_engine.period_bounds(period, today) == bounds
+
+
+def test_period_bounds_rejects_unknown_period():
+    with pytest.raises(ValueError):
+        sales_engine.period_bounds("Yearly", date(2025, 10, 15))
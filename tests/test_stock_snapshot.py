@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+
+import stock_ledger
+
+
+@pytest.fixture
+def balances(monkeypatch):
+    """Rows get_stamped_balances() returns on the next reload."""
+    rows = {}
+    monkeypatch.setattr(stock_ledger, "get_stamped_balances", lambda pool: dict(rows))
+    return rows
+
+
+def snapshot(today=date(2025, 10, 15)):
+    return stock_ledger.StockSnapshot(None, ttl=0, today=lambda: today)
+
+
+def test_publish_ignores_older_stamp():
+    snap = snapshot()
+    snap.publish({"Idli": (7, 20)})
+    snap.publish({"Idli": (9, 12)})
+    assert snap._levels["Idli"] == 7
+    snap.publish({"Idli": (6, 21)})
+    assert snap._levels["Idli"] == 6
+
+
+def test_reload_read_before_a_write_does_not_undo_it(balances):
+    snap = snapshot()
+    balances["Idli"] = (10, 5)
+    assert snap.get()["Idli"] == 10
+    snap.publish({"Idli": (8, 6)})
+    balances["Idli"] = (10, 5)  # a reload that started before movement 6 committed
+    assert snap.get()["Idli"] == 8
+    balances["Idli"] = (4, 9)
+    assert snap.get()["Idli"] == 4
+
+
+def test_new_day_starts_from_the_reload(balances):
+    day = [date(2025, 10, 15)]
+    snap = stock_ledger.StockSnapshot(None, ttl=0, today=lambda: day[0])
+    snap.publish({"Idli": (3, 500)})
+    day[0] = date(2025, 10, 16)
+    balances["Idli"] = (50, 0)
+    assert snap.get() == {"Idli": 50}
+
+
+def test_get_serves_the_cached_mapping_within_ttl(balances):
+    snap = stock_ledger.StockSnapshot(None, ttl=60, today=lambda: date(2025, 10, 15))
+    balances["Idli"] = (10, 1)
+    assert snap.level("Idli") == 10
+    balances["Idli"] = (2, 2)
+    assert snap.level("Idli") == 10
+    assert snap.reloads == 1
+    snap.invalidate()
+    assert snap.level("Idli") == 2
+
+
+def test_reload_drops_items_deleted_from_the_catalog(balances):
+    snap = snapshot()
+    balances.update({"Idli": (10, 5), "Vada": (4, 7)})
+    assert snap.get() == {"Idli": 10, "Vada": 4}
+    snap.publish({"Vada": (3, 8)})
+    del balances["Vada"]
+    assert snap.get() == {"Idli": 10}
+    assert snap.level("Vada") == 0